@@ -0,0 +1,183 @@
+import sys
+import tracemalloc
+from collections import Counter
+
+# sys.monitoring (3.12+) is what lets us count object constructions
+_monitoring = getattr(sys, "monitoring", None)
+
+
+class StageAllocs:
+    __slots__ = ("calls", "peak_bytes", "net_bytes", "objects")
+
+    def __init__(self):
+        self.calls = 0
+        self.peak_bytes = 0
+        self.net_bytes = 0
+        self.objects = Counter()
+
+
+class _Stage:
+    __slots__ = ("tracker", "name", "start", "peak", "objects")
+
+    def __init__(self, tracker, name):
+        self.tracker = tracker
+        self.name = name
+
+    def __enter__(self):
+        self.tracker._push(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.tracker._pop(self)
+
+
+class AllocTracker:
+    """Allocation accounting per frame and per stage.
+
+    Drop-in for a trace.Tracer, so `ctx.tracer = AllocTracker()` makes every
+    traced stage report what it allocated. For each stage it keeps the peak
+    bytes above the level it started at (short lived garbage such as
+    temporary arrays), the bytes still held at its end, and with
+    sys.monitoring the number of objects constructed by calling a type, per
+    type (so one glm.vec2 per pixel shows up as width * height vec2s).
+
+    tracemalloc and the counters are process wide, run with pipelined=False
+    so stages on other threads do not bleed into each other. The tracker's
+    own bookkeeping is measured and taken out of every stage.
+    """
+
+    def __init__(self, count_objects=True):
+        self.stages = {}
+        self.frames = 0
+        self.count_objects = count_objects and _monitoring is not None
+        self._stack = []
+        self._objects = Counter()
+        self._tool = None
+        # bytes the tracker itself holds, and whether it is doing bookkeeping
+        self._own = 0
+        self._busy = False
+        self._current = self._peak = 0
+        self._empty_net = 0
+
+    def start(self):
+        tracemalloc.start()
+        if self.count_objects:
+            tool = _monitoring.PROFILER_ID
+            _monitoring.use_tool_id(tool, "alloc")
+            _monitoring.register_callback(tool, _monitoring.events.CALL, self._on_call)
+            _monitoring.set_events(tool, _monitoring.events.CALL)
+            self._tool = tool
+        self._calibrate()
+        return self
+
+    def stop(self):
+        if self._tool is not None:
+            _monitoring.set_events(self._tool, 0)
+            _monitoring.register_callback(self._tool, _monitoring.events.CALL, None)
+            _monitoring.free_tool_id(self._tool)
+            self._tool = None
+        tracemalloc.stop()
+
+    def _calibrate(self):
+        # a `with` can free its bound __exit__ inside the stage (3.13 does),
+        # so measure what an empty stage nets and take it off every stage
+        self._empty_net = 0
+        for _ in range(3):
+            with _Stage(self, None):
+                pass
+            empty = self.stages.pop(None)
+        self._empty_net = empty.net_bytes
+
+    def _on_call(self, code, offset, func, arg0):
+        # constructions by the tracker (its Counters, _Stage) are not the stage's
+        if self._busy or code.co_filename == __file__:
+            return
+        if isinstance(func, type):
+            self._objects[func.__qualname__] += 1
+
+    def span(self, name, cat="render", args=None):
+        return _Stage(self, name)
+
+    def frame(self):
+        # frames are stages too, they also set what per frame averages divide by
+        self.frames += 1
+        return _Stage(self, "frame")
+
+    def _push(self, stage):
+        self._busy = True
+        self._read()
+        if self._stack:
+            parent = self._stack[-1]
+            parent.peak = max(parent.peak, self._peak - self._own)
+        stage.objects = self._objects.copy()
+        self._stack.append(stage)
+        stage.start = stage.peak = self._current - self._own
+        self._settle()
+        self._busy = False
+
+    def _pop(self, stage):
+        self._busy = True
+        self._read()
+        self._stack.pop()
+        stage.peak = max(stage.peak, self._peak - self._own)
+        if self._stack:
+            parent = self._stack[-1]
+            parent.peak = max(parent.peak, stage.peak)
+
+        stats = self.stages.get(stage.name)
+        if stats is None:
+            stats = self.stages[stage.name] = StageAllocs()
+        stats.calls += 1
+        stats.peak_bytes += stage.peak - stage.start
+        stats.net_bytes += self._current - self._own - stage.start - self._empty_net
+        stats.objects.update(self._objects - stage.objects)
+        # dropped here, where freeing them is the tracker's bookkeeping
+        stage.objects = stage.start = stage.peak = None
+        self._settle()
+        self._busy = False
+
+    def _read(self):
+        # kept on the tracker rather than in locals, so the ints are freed by
+        # the next reading's bookkeeping and not inside a stage
+        self._current, self._peak = tracemalloc.get_traced_memory()
+
+    def _settle(self):
+        # whatever the bookkeeping since _read kept or freed is the tracker's,
+        # and its temporaries must not count as anyone's peak
+        self._own += tracemalloc.get_traced_memory()[0] - self._current
+        tracemalloc.reset_peak()
+
+    def per_frame(self, name):
+        # (peak bytes, net bytes, objects) a frame spends in this stage on average
+        stats = self.stages.get(name)
+        frames = max(self.frames, 1)
+        if stats is None:
+            return 0, 0, 0
+        return (
+            stats.peak_bytes / frames,
+            stats.net_bytes / frames,
+            stats.objects.total() / frames,
+        )
+
+    def report(self, top=3):
+        lines = [
+            f"{'stage':>14} {'calls':>7} {'peak B/frame':>13}"
+            f" {'net B/frame':>12} {'objs/frame':>11}  top objects"
+        ]
+        frames = max(self.frames, 1)
+        for name, stats in self.stages.items():
+            peak, net, objects = self.per_frame(name)
+            common = ", ".join(
+                f"{kind} {n / frames:.0f}" for kind, n in stats.objects.most_common(top)
+            )
+            lines.append(
+                f"{name:>14} {stats.calls:>7} {peak:>13.0f} {net:>12.0f}"
+                f" {objects:>11.0f}  {common}"
+            )
+        return "\n".join(lines)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
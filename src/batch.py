@@ -0,0 +1,101 @@
+import os
+
+# keep stdout clean for `--video -`, the pygame banner would end up in the stream
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+import argparse
+import math
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import glm
+
+from .camera import Camera
+from .context import RenderContext
+from .render import gen_cube_grid_scene
+from .texture import unpack_rgb
+from .video import RAW_RGB, Y4M, VideoSink
+
+# per process state, filled once by _init_worker
+_worker = None
+
+
+def _init_worker(ctx, scene_factory):
+    global _worker
+    ctx.pipelined = False  # the pool already keeps every core busy
+    ctx.texture  # load it now rather than inside the first frame
+    _worker = (ctx, scene_factory())
+
+
+def _render_pose(cam):
+    ctx, scene = _worker
+    return ctx.render(cam, scene).color.copy()
+
+
+def render_sequence(poses, ctx=None, workers=None, scene_factory=None, in_flight=None):
+    """Render one frame per Camera in poses across a process pool.
+
+    Yields packed (height, width) uint32 frames in pose order. Every worker
+    gets its own copy of ctx (a default RenderContext if None), and loads the
+    texture and builds the scene once. scene_factory must be a
+    picklable module level function. At most in_flight frames are queued or
+    waiting to be consumed, so long sequences do not pile up in memory.
+    """
+    workers = workers or os.cpu_count()
+    in_flight = in_flight or workers * 2
+    initargs = (ctx or RenderContext(), scene_factory or gen_cube_grid_scene)
+    with ProcessPoolExecutor(
+        workers, initializer=_init_worker, initargs=initargs
+    ) as pool:
+        pending = deque()
+        for cam in poses:
+            pending.append(pool.submit(_render_pose, cam))
+            if len(pending) >= in_flight:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def orbit_path(count, center=glm.vec3(67.5, 0, 67.5), radius=90.0, height=-20.0):
+    # circle the cube grid, the camera looks at cam.dir * 10
+    poses = []
+    for i in range(count):
+        angle = 2 * math.pi * i / count
+        pos = center + glm.vec3(
+            radius * math.cos(angle), height, radius * math.sin(angle)
+        )
+        poses.append(Camera(pos, center / 10.0))
+    return poses
+
+
+def save_frames(frames, out_dir, name="frame_{:05d}.png"):
+    import pygame
+
+    os.makedirs(out_dir, exist_ok=True)
+    for i, frame in enumerate(frames):
+        surface = pygame.surfarray.make_surface(unpack_rgb(frame).transpose(1, 0, 2))
+        pygame.image.save(surface, os.path.join(out_dir, name.format(i)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="render a camera orbit offline")
+    parser.add_argument("--frames", type=int, default=120)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--out", default="frames", help="png output directory")
+    parser.add_argument("--video", help="stream to this file instead, - for stdout")
+    parser.add_argument("--format", choices=(Y4M, RAW_RGB), default=Y4M)
+    parser.add_argument("--fps", type=int, default=30)
+    args = parser.parse_args()
+
+    ctx = RenderContext()
+    frames = render_sequence(orbit_path(args.frames), ctx, args.workers)
+    if args.video is None:
+        save_frames(frames, args.out)
+        return
+    with VideoSink(args.video, ctx.width, ctx.height, args.format, args.fps) as sink:
+        for frame in frames:
+            sink.write(frame)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+import os
+
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+import argparse
+import sys
+import time
+
+import glm
+import numpy as np
+
+from .alloc import AllocTracker
+from .batch import orbit_path
+from .context import RenderContext
+from .render import gen_cube_grid_scene
+from .texture import ADDRESS_MODES, LAYOUTS, Texture
+
+# scene -> (scene factory, orbit center, orbit radius)
+SCENES = {
+    "grid": (gen_cube_grid_scene, glm.vec3(67.5, 0, 67.5), 90.0),
+    "small": (lambda: gen_cube_grid_scene(count=4), glm.vec3(22.5, 0, 22.5), 45.0),
+}
+
+# per frame allocation budgets: scene -> (peak bytes, objects constructed).
+# measured over the default 4 frame orbit and set a bit above what the renderer
+# does today, raise them only on purpose
+ALLOC_BUDGETS = {
+    "grid": (112_000, 180_000),
+    "small": (56_000, 84_000),
+}
+
+
+def texture_walks(size, count):
+    # texel coordinates in the order a rasterizer would touch them
+    side = int(count**0.5)
+    i, j = np.meshgrid(np.arange(side), np.arange(side), indexing="xy")
+    i = i.ravel()
+    j = j.ravel()
+    angle = np.radians(30)
+    rng = np.random.default_rng(0)
+    walks = {
+        "rows": (i, j),
+        "columns": (j, i),
+        # a face rotated on screen walks the texture at an angle
+        "rotated": (
+            i * np.cos(angle) - j * np.sin(angle),
+            i * np.sin(angle) + j * np.cos(angle),
+        ),
+        "random": (rng.integers(0, size, i.size), rng.integers(0, size, i.size)),
+    }
+    return {
+        name: (
+            np.asarray(x).astype(np.int64) % size,
+            np.asarray(y).astype(np.int64) % size,
+        )
+        for name, (x, y) in walks.items()
+    }
+
+
+def time_call(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def bench_textures(sizes, count, repeat):
+    rng = np.random.default_rng(0)
+    rows = []
+    for size in sizes:
+        texels = rng.integers(0, 1 << 24, (size, size), dtype=np.uint32)
+        walks = texture_walks(size, count)
+        for layout in LAYOUTS:
+            tex = Texture(texels, layout)
+            for name, (xs, ys) in walks.items():
+                seconds = time_call(lambda: tex.fetch(xs, ys), repeat)
+                rows.append((size, layout, name, seconds * 1e9 / xs.size))
+
+    print(f"{'size':>6} {'layout':>8} {'walk':>8} {'ns/texel':>9}")
+    for size, layout, name, ns in rows:
+        print(f"{size:>6} {layout:>8} {name:>8} {ns:>9.2f}")
+    return rows
+
+
+def bench_filters(size, count, repeat):
+    rng = np.random.default_rng(0)
+    tex = Texture(rng.integers(0, 1 << 24, (size, size), dtype=np.uint32))
+    # a magnified, slightly rotated walk, like a face close to the camera
+    u, v = (
+        np.asarray(c, np.float64) / (size * 4)
+        for c in texture_walks(size * 4, count)["rotated"]
+    )
+    samplers = {}
+    for address in ADDRESS_MODES:
+        samplers[f"nearest {address}"] = lambda a=address: tex.sample(u, v, a)
+        samplers[f"bilinear int {address}"] = lambda a=address: tex.sample_bilinear(
+            u, v, a
+        )
+        samplers[f"bilinear f32 {address}"] = lambda a=address: tex.sample_bilinear(
+            u, v, a, integer=False
+        )
+    rows = [
+        (name, time_call(fn, repeat) * 1e9 / u.size) for name, fn in samplers.items()
+    ]
+    # each filter against nearest sampling in the same address mode
+    nearest = {name.split()[-1]: ns for name, ns in rows if name.startswith("nearest")}
+    print(f"{'sampler':>20} {'ns/sample':>10} {'x nearest':>10}")
+    for name, ns in rows:
+        print(f"{name:>20} {ns:>10.2f} {ns / nearest[name.split()[-1]]:>10.2f}")
+    return rows
+
+
+def bench_allocs(scene_name, frames, budget_bytes=None, budget_objects=None):
+    factory, center, radius = SCENES[scene_name]
+    scene = factory()
+    ctx = RenderContext(pipelined=False)
+    poses = orbit_path(frames + 1, center, radius)
+    # the first frame loads the texture and warms caches, keep it out
+    ctx.render(poses[0], scene)
+    tracker = ctx.tracer = AllocTracker()
+    with tracker:
+        for cam in poses[1:]:
+            with tracker.frame():
+                ctx.render(cam, scene)
+    print(tracker.report())
+
+    peak, _, objects = tracker.per_frame("frame")
+    over = []
+    if budget_objects is not None and not tracker.count_objects:
+        # without sys.monitoring (before 3.12) nothing is counted, a budget
+        # that always passes would hide regressions
+        over.append("objects budget set but objects are not counted here")
+    if budget_bytes is not None and peak > budget_bytes:
+        over.append(f"peak {peak:.0f} B/frame > budget {budget_bytes}")
+    if budget_objects is not None and objects > budget_objects:
+        over.append(f"{objects:.0f} objects/frame > budget {budget_objects}")
+    for line in over:
+        print(f"{scene_name}: {line}")
+    return not over
+
+
+def main():
+    parser = argparse.ArgumentParser(description="software renderer benchmarks")
+    sub = parser.add_subparsers(dest="bench", required=True)
+
+    textures = sub.add_parser("textures", help="texel fetch cost per memory layout")
+    textures.add_argument("--sizes", type=int, nargs="+", default=[64, 1024, 4096])
+    textures.add_argument("--count", type=int, default=1 << 20)
+    textures.add_argument("--repeat", type=int, default=5)
+
+    filters = sub.add_parser("filters", help="nearest vs bilinear sampling cost")
+    filters.add_argument("--size", type=int, default=256)
+    filters.add_argument("--count", type=int, default=1 << 18)
+    filters.add_argument("--repeat", type=int, default=5)
+
+    allocs = sub.add_parser(
+        "allocs", help="allocations per frame and stage, fails over budget"
+    )
+    allocs.add_argument("--scenes", nargs="+", choices=list(SCENES), default=["small"])
+    allocs.add_argument("--frames", type=int, default=4)
+    allocs.add_argument("--budget-bytes", type=int, help="overrides ALLOC_BUDGETS")
+    allocs.add_argument("--budget-objects", type=int, help="overrides ALLOC_BUDGETS")
+
+    args = parser.parse_args()
+    if args.bench == "textures":
+        bench_textures(args.sizes, args.count, args.repeat)
+    elif args.bench == "filters":
+        bench_filters(args.size, args.count, args.repeat)
+    elif args.bench == "allocs":
+        ok = True
+        for name in args.scenes:
+            budget_bytes, budget_objects = ALLOC_BUDGETS[name]
+            if args.budget_bytes is not None:
+                budget_bytes = args.budget_bytes
+            if args.budget_objects is not None:
+                budget_objects = args.budget_objects
+            ok &= bench_allocs(name, args.frames, budget_bytes, budget_objects)
+        if not ok:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
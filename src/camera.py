@@ -0,0 +1,132 @@
+import itertools
+import math
+
+import glm
+
+from .scene import frustum_planes
+
+# shared by all cameras, so versions stay comparable across copies
+_versions = itertools.count(1)
+
+
+class Camera:
+    """Camera with cached view, projection, view-projection and frustum planes.
+
+    Assigning pos, dir or the lens settings bumps `version` and drops the
+    caches that depend on them, everything else is rebuilt lazily on access.
+    In-place updates like `cam.pos += v` go through the setter too, but
+    mutating a component (`cam.pos.x = 1`) is not noticed.
+    """
+
+    def __init__(self, pos, dir, fov=90.0, aspect=1.5, near=0.1, far=100.0):
+        self._pos = glm.vec3(pos)
+        self._dir = glm.vec3(dir)
+        self.yaw = 0.0
+        self.pitch = 0.0
+        self._aimed = False  # dir has been derived from yaw and pitch
+        self._fov = fov
+        self._aspect = aspect
+        self.near = near
+        self.far = far
+        self._view = None
+        self._projection = None
+        self._view_proj = None
+        self._planes = None
+        self.version = next(_versions)
+
+    def _changed(self, view=False, projection=False):
+        if view:
+            self._view = None
+        if projection:
+            self._projection = None
+        self._view_proj = None
+        self._planes = None
+        self.version = next(_versions)
+
+    @property
+    def pos(self):
+        return self._pos
+
+    @pos.setter
+    def pos(self, value):
+        self._pos = glm.vec3(value)
+        self._changed(view=True)
+
+    @property
+    def dir(self):
+        return self._dir
+
+    @dir.setter
+    def dir(self, value):
+        self._dir = glm.vec3(value)
+        self._changed(view=True)
+
+    @property
+    def fov(self):
+        return self._fov
+
+    @property
+    def aspect(self):
+        return self._aspect
+
+    def set_lens(self, fov, aspect):
+        if fov != self._fov or aspect != self._aspect:
+            self._fov = fov
+            self._aspect = aspect
+            self._changed(projection=True)
+
+    @property
+    def view(self):
+        if self._view is None:
+            self._view = glm.lookAt(self._pos, self._dir * 10.0, glm.vec3(0, -1, 0))
+        return self._view
+
+    @property
+    def projection(self):
+        if self._projection is None:
+            self._projection = glm.perspective(
+                glm.radians(self._fov), self._aspect, self.near, self.far
+            )
+        return self._projection
+
+    @property
+    def view_proj(self):
+        if self._view_proj is None:
+            self._view_proj = self.projection * self.view
+        return self._view_proj
+
+    @property
+    def frustum_planes(self):
+        if self._planes is None:
+            self._planes = frustum_planes(self.view_proj)
+        return self._planes
+
+    def update(self, mouse_delta, speed=0.5):
+        if not mouse_delta[0] and not mouse_delta[1] and self._aimed:
+            return  # nothing moved, keep dir and the cached matrices
+
+        # Update rotation angles
+        self.yaw -= mouse_delta[0] * speed
+        self.pitch += mouse_delta[1] * speed
+
+        # Constrain the pitch
+        self.pitch = max(-90, min(90, self.pitch))
+
+        # Calculate the new direction vector
+        yaw = math.radians(self.yaw)
+        pitch = math.radians(self.pitch)
+        cos_pitch = math.cos(pitch)
+        dx = math.cos(yaw) * cos_pitch
+        dy = math.sin(pitch)
+        dz = math.sin(yaw) * cos_pitch
+        self.dir = glm.vec3(dx, dy, dz)
+        self._aimed = True
+
+    def copy(self):
+        # keeps the caches and the version, but not the vectors, since the
+        # original may still update them in place
+        cam = object.__new__(Camera)
+        cam.__dict__.update(self.__dict__)
+        cam._pos = glm.vec3(self._pos)
+        cam._dir = glm.vec3(self._dir)
+        return cam
@@ -0,0 +1,178 @@
+import glm
+
+from . import render
+from .framebuffer import Framebuffer
+from .pipeline import FramePipeline
+from .texture import LINEAR, NEAREST, WRAP, Texture
+from .texture_manager import TextureManager
+from .trace import span
+
+
+class RenderContext:
+    """One renderer: resolution, buffers, textures and pipeline settings.
+
+    Nothing heavy happens up front. The framebuffer and texture are created
+    on first use, and pygame is only initialized by open_window(), so several
+    contexts at different resolutions can live side by side in one process
+    (or be pickled to worker processes, resources are left behind).
+    """
+
+    def __init__(
+        self,
+        resolution=(240, 160),
+        cut_factor=1,
+        window_scale=4,
+        fov=90.0,
+        perspective_span=8,
+        texture_path="./box.png",
+        texture_layout=LINEAR,
+        texture_budget=64 << 20,
+        texture_filter=NEAREST,
+        texture_address=WRAP,
+        pipelined=False,
+        tracer=None,
+        lighting=None,
+        msaa=False,
+    ):
+        self.cut_factor = cut_factor
+        self.resolution = glm.vec2(resolution) / cut_factor
+        self.window_size = self.resolution * window_scale * cut_factor
+        self.fov = fov
+        # exact perspective divide every this many pixels along a span, 0 for plain affine uvs
+        self.perspective_span = perspective_span
+        self.texture_path = texture_path
+        self.texture_layout = texture_layout
+        # bytes of decoded textures the texture manager may keep around
+        self.texture_budget = texture_budget
+        # BILINEAR switches to the numpy row rasterizer, which filters whole
+        # rows of uvs at once, WRAP or CLAMP uvs outside 0..1
+        self.texture_filter = texture_filter
+        self.texture_address = texture_address
+        # transform and cull the next frame on a worker thread while this one rasterizes
+        self.pipelined = pipelined
+        # a trace.Tracer to time the render stages with, None to skip that
+        self.tracer = tracer
+        # a lighting.Lighting, None for plain unlit texturing
+        self.lighting = lighting
+        # 4x coverage multisampling, edges are antialiased but every pixel
+        # is still only textured once
+        self.msaa = msaa
+
+        self._fb = None
+        self._texture = None
+        self._textures = None
+        self._pipeline = None
+        self._last_frame = None
+        self.window = None
+
+    @property
+    def width(self):
+        return int(self.resolution.x)
+
+    @property
+    def height(self):
+        return int(self.resolution.y)
+
+    @property
+    def samples(self):
+        return 4 if self.msaa else 1
+
+    @property
+    def fb(self):
+        if self._fb is None:
+            self._fb = Framebuffer(self.width, self.height, samples=self.samples)
+        return self._fb
+
+    @property
+    def texture(self):
+        if self._texture is None:
+            self._texture = Texture.load(self.texture_path, self.texture_layout)
+        return self._texture
+
+    @property
+    def textures(self):
+        # instances can use handles from this instead of loaded textures
+        if self._textures is None:
+            self._textures = TextureManager(self.texture_budget, self.texture_layout)
+        return self._textures
+
+    def open_window(self):
+        # the framebuffer switches to a pygame surface so presenting needs no copy
+        import pygame
+
+        pygame.init()
+        self.window = pygame.display.set_mode(self.window_size.to_tuple())
+        surface = pygame.Surface((self.width, self.height))
+        self._fb = Framebuffer.for_surface(surface, self.samples)
+        return self.window
+
+    def prepare_frame(self, cam, scene):
+        # a frame only depends on these, so an unchanged view reuses the last one.
+        # the lens goes on first, so a version bump from it is part of the key
+        render.view_projection(self, cam)
+        lights = None if self.lighting is None else self.lighting.signature()
+        textures = None if self._textures is None else self._textures.version
+        key = (
+            cam.version,
+            scene.version,
+            self.fov,
+            self.width,
+            self.height,
+            lights,
+            textures,
+        )
+        if self._last_frame is None or self._last_frame[0] != key:
+            with span(self.tracer, "prepare"):
+                frame = render.prepare_frame(self, self.texture, cam, scene)
+            self._last_frame = (key, frame)
+        return self._last_frame[1]
+
+    def next_frame(self, cam, scene):
+        # with pipelining this is the frame prepared on the previous call
+        if not self.pipelined:
+            return self.prepare_frame(cam, scene)
+        if self._pipeline is None:
+            self._pipeline = FramePipeline(self.prepare_frame)
+        # set the lens on the caller's camera, not just on the copy, or its
+        # version never matches the one the last frame was prepared with
+        render.view_projection(self, cam)
+        return self._pipeline.swap(cam.copy(), scene)
+
+    def wait_prepared(self):
+        # the scene may be changed again once this returns
+        if self._pipeline is not None:
+            self._pipeline.wait()
+
+    def render(self, cam, scene):
+        frame = self.next_frame(cam, scene)
+        with self.fb as fb, span(self.tracer, "draw"):
+            fb.clear()
+            render.draw_frame(self, fb, frame)
+        return self.fb
+
+    def close(self):
+        if self._pipeline is not None:
+            self._pipeline.close()
+            self._pipeline = None
+        if self._textures is not None:
+            self._textures.close()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        # tracers stay with the process that owns them
+        state.update(
+            _fb=None,
+            _texture=None,
+            _textures=None,
+            _pipeline=None,
+            _last_frame=None,
+            window=None,
+            tracer=None,
+        )
+        return state
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,185 @@
+import asyncio
+import io
+import threading
+
+import numpy as np
+
+from .texture import unpack_rgb
+
+JPEG = "jpeg"
+PNG = "png"
+CONTENT_TYPES = {JPEG: "image/jpeg", PNG: "image/png"}
+BOUNDARY = "frame"
+
+INDEX = b"""<!doctype html>
+<title>software renderer</title>
+<body style="margin:0;background:#000">
+<img src="/stream" style="width:100%;image-rendering:pixelated">
+"""
+
+
+def encode_image(frame, fmt):
+    import pygame
+
+    surface = pygame.surfarray.make_surface(unpack_rgb(frame).transpose(1, 0, 2))
+    buf = io.BytesIO()
+    pygame.image.save(surface, buf, f"frame.{'jpg' if fmt == JPEG else 'png'}")
+    return buf.getvalue()
+
+
+class FrameServer:
+    """Serves the latest published frame over http from a background thread.
+
+    /stream is a multipart stream (MJPEG, or PNG parts), /frame a single image
+    and / a page showing the stream. publish() only hands the frame over, it
+    is encoded once on the server side however many clients are connected.
+    A client that is still busy receiving simply skips to the newest frame
+    when it is ready again, so slow clients never hold up the renderer.
+    """
+
+    def __init__(self, host="127.0.0.1", port=8080, fmt=JPEG):
+        if fmt not in CONTENT_TYPES:
+            raise ValueError(f"unknown image format {fmt!r}")
+        self.host = host
+        self.port = port
+        self.fmt = fmt
+        self.content_type = CONTENT_TYPES[fmt]
+
+        self.lock = threading.Lock()
+        self.pending = None
+        self.encoding = False
+        self.seq = 0
+        self.latest = None
+
+        self.loop = None
+        self.thread = None
+        self.clients = set()
+        self.started = threading.Event()
+        self.error = None
+
+    def start(self):
+        self.thread = threading.Thread(
+            target=self._run, name="frame-server", daemon=True
+        )
+        self.thread.start()
+        self.started.wait()
+        if self.error is not None:
+            raise self.error
+        return self
+
+    def _run(self):
+        try:
+            asyncio.run(self._serve())
+        except Exception as e:
+            self.error = e
+            self.started.set()
+
+    async def _serve(self):
+        self.loop = asyncio.get_running_loop()
+        self.changed = asyncio.Condition()
+        self.stopping = asyncio.Event()
+        server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = server.sockets[0].getsockname()[1]
+        self.started.set()
+        async with server:
+            await self.stopping.wait()
+            # streams never end on their own, closing the server waits for them
+            for task in list(self.clients):
+                task.cancel()
+
+    def stop(self):
+        if self.thread is None:
+            return
+        self.loop.call_soon_threadsafe(self.stopping.set)
+        self.thread.join()
+        self.thread = None
+
+    def publish(self, frame):
+        # called from the render loop, never blocks on encoding or clients
+        if self.thread is None:
+            return
+        with self.lock:
+            self.pending = np.array(frame, np.uint32)
+            if self.encoding:
+                return  # the running encode picks up the newest frame
+            self.encoding = True
+        self.loop.call_soon_threadsafe(self.loop.create_task, self._encode_pending())
+
+    async def _encode_pending(self):
+        while True:
+            with self.lock:
+                frame = self.pending
+                self.pending = None
+                if frame is None:
+                    self.encoding = False
+                    return
+            data = await self.loop.run_in_executor(None, encode_image, frame, self.fmt)
+            async with self.changed:
+                self.seq += 1
+                self.latest = data
+                self.changed.notify_all()
+
+    async def _handle(self, reader, writer):
+        task = asyncio.current_task()
+        self.clients.add(task)
+        try:
+            request = await reader.readline()
+            while (await reader.readline()).strip():
+                pass  # headers are not needed
+            parts = request.decode("latin-1").split()
+            path = parts[1] if len(parts) > 1 else "/"
+            if path == "/":
+                await self._respond(writer, "200 OK", "text/html", INDEX)
+            elif path == "/frame":
+                await self._wait_frame(0)
+                await self._respond(writer, "200 OK", self.content_type, self.latest)
+            elif path == "/stream":
+                await self._stream(writer)
+            else:
+                await self._respond(writer, "404 Not Found", "text/plain", b"not found")
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass  # the client went away
+        finally:
+            self.clients.discard(task)
+            writer.close()
+
+    async def _respond(self, writer, status, content_type, body):
+        head = (
+            f"HTTP/1.0 {status}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            "Cache-Control: no-cache\r\n\r\n"
+        )
+        writer.write(head.encode("latin-1") + body)
+        await writer.drain()
+
+    async def _wait_frame(self, seen):
+        async with self.changed:
+            await self.changed.wait_for(lambda: self.seq != seen)
+            return self.seq, self.latest
+
+    async def _stream(self, writer):
+        writer.write(
+            (
+                "HTTP/1.0 200 OK\r\n"
+                f"Content-Type: multipart/x-mixed-replace; boundary={BOUNDARY}\r\n"
+                "Cache-Control: no-cache\r\n\r\n"
+            ).encode("latin-1")
+        )
+        seen = 0
+        while True:
+            # frames published while this client was draining are skipped
+            seen, data = await self._wait_frame(seen)
+            head = (
+                f"--{BOUNDARY}\r\n"
+                f"Content-Type: {self.content_type}\r\n"
+                f"Content-Length: {len(data)}\r\n\r\n"
+            )
+            writer.write(head.encode("latin-1") + data + b"\r\n")
+            await writer.drain()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -0,0 +1,79 @@
+import numpy as np
+
+RGB_MASKS = (0xFF0000, 0x00FF00, 0x0000FF)
+
+# sub-sample positions relative to the pixel, a rotated grid so near
+# horizontal and near vertical edges both get four distinct steps
+MSAA_OFFSETS = ((-0.125, -0.375), (0.375, -0.125), (-0.375, 0.125), (0.125, 0.375))
+
+
+class Framebuffer:
+    """Color and depth buffers for one render target.
+
+    `color` holds packed 0xRRGGBB ints indexed [y][x] like `depth`. Without a
+    surface it is plain memory. With one (see for_surface) it is a live
+    pixels2d view of the surface between begin() and end(), so rasterizers
+    write straight into the surface memory. The surface stays locked for that
+    time, so blit it only after end().
+
+    With samples=4 there are also per sample color and depth buffers
+    ([y][x][sample], positions in sample_offsets) that multisampling
+    rasterizers write to, resolve() averages them into `color`.
+    """
+
+    def __init__(self, width, height, surface=None, samples=1):
+        if samples not in (1, len(MSAA_OFFSETS)):
+            raise ValueError(f"unsupported sample count {samples}")
+        self.surface = surface
+        self.width = width
+        self.height = height
+        self.depth = np.full((height, width), np.inf)
+        self.color = None
+        if surface is None:
+            self.color = np.zeros((height, width), np.uint32)
+        self.samples = samples
+        self.sample_offsets = MSAA_OFFSETS if samples > 1 else ((0.0, 0.0),)
+        self.sample_color = None
+        self.sample_depth = None
+        if samples > 1:
+            self.sample_color = np.zeros((height, width, samples), np.uint32)
+            self.sample_depth = np.full((height, width, samples), np.inf)
+
+    @classmethod
+    def for_surface(cls, surface, samples=1):
+        if surface.get_bitsize() != 32 or surface.get_masks()[:3] != RGB_MASKS:
+            raise ValueError("framebuffer needs a 32 bit 0xRRGGBB surface")
+        return cls(*surface.get_size(), surface, samples)
+
+    def begin(self):
+        if self.surface is not None:
+            import pygame
+
+            self.color = pygame.surfarray.pixels2d(self.surface).T
+
+    def end(self):
+        if self.surface is not None:
+            # dropping the last reference to the view unlocks the surface
+            self.color = None
+
+    def clear(self, color=0):
+        self.color[:] = color
+        self.depth.fill(np.inf)
+        if self.samples > 1:
+            self.sample_color.fill(color)
+            self.sample_depth.fill(np.inf)
+
+    def resolve(self):
+        # box filter the samples into color. four 8 bit channels sum to at most
+        # 10 bits, so red and blue are still added in one go without overlap
+        s = self.sample_color
+        rb = (s & 0xFF00FF).sum(axis=2, dtype=np.uint32) + 0x020002
+        g = (s & 0x00FF00).sum(axis=2, dtype=np.uint32) + 0x000200
+        self.color[:] = ((rb >> 2) & 0xFF00FF) | ((g >> 2) & 0x00FF00)
+
+    def __enter__(self):
+        self.begin()
+        return self
+
+    def __exit__(self, *exc):
+        self.end()
@@ -0,0 +1,272 @@
+import os
+
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+import argparse
+import sys
+import time
+
+import glm
+import numpy as np
+
+from .camera import Camera
+from .context import RenderContext
+from .lighting import FLAT, GOURAUD, default_lighting
+from .lod import LODMesh, gen_lod_levels
+from .mesh import subdivided_cube_mesh
+from .render import gen_cube_grid_scene
+from .texture import BILINEAR, pack_rgb, unpack_rgb
+
+GOLDEN_DIR = "goldens"
+
+# name -> RenderContext settings, the backend whose goldens it must match, tolerances
+BACKENDS = {}
+
+
+def register_backend(
+    name, golden=None, tolerance=0, depth_tolerance=1e-5, max_bad=0.0, **settings
+):
+    """Add a rasterizer configuration to the harness.
+
+    settings are RenderContext keyword arguments. A backend with golden=None
+    is a reference and owns goldens of its own, anything else is checked
+    against the goldens of the named backend. tolerance is the allowed
+    difference per color channel, depth_tolerance the allowed absolute depth
+    difference and max_bad the fraction of pixels allowed to exceed them.
+    """
+    BACKENDS[name] = dict(
+        settings=settings,
+        golden=golden or name,
+        tolerance=tolerance,
+        depth_tolerance=depth_tolerance,
+        max_bad=max_bad,
+    )
+
+
+register_backend("affine", perspective_span=0)
+# exact perspective divide at every pixel, the reference for span subdivision.
+# nearest sampling turns a slightly different uv into a whole other texel, so
+# the spans are allowed a small fraction of such pixels instead of a tolerance
+register_backend("perspective-exact", perspective_span=1)
+register_backend(
+    "perspective",
+    "perspective-exact",
+    depth_tolerance=1e-4,
+    max_bad=0.03,
+    perspective_span=8,
+)
+register_backend(
+    "perspective-16",
+    "perspective-exact",
+    depth_tolerance=1e-4,
+    max_bad=0.05,
+    perspective_span=16,
+)
+register_backend("flat", perspective_span=8, lighting=default_lighting(FLAT))
+register_backend("gouraud", perspective_span=8, lighting=default_lighting(GOURAUD))
+register_backend("bilinear", texture_filter=BILINEAR)
+register_backend("msaa", msaa=True)
+register_backend("msaa-bilinear", msaa=True, texture_filter=BILINEAR)
+
+# depth does not depend on filtering or lighting, so the numpy rasterizers and
+# the lit backends keep their own goldens for color, and here have their depth
+# and coverage checked against the reference (tolerance=255 ignores color)
+register_backend(
+    "bilinear-depth",
+    "perspective-exact",
+    tolerance=255,
+    depth_tolerance=1e-3,
+    max_bad=0.001,
+    texture_filter=BILINEAR,
+)
+register_backend(
+    "flat-depth",
+    "perspective-exact",
+    tolerance=255,
+    depth_tolerance=1e-3,
+    max_bad=0.001,
+    perspective_span=8,
+    lighting=default_lighting(FLAT),
+)
+register_backend(
+    "gouraud-depth",
+    "perspective-exact",
+    tolerance=255,
+    depth_tolerance=1e-3,
+    max_bad=0.001,
+    perspective_span=8,
+    lighting=default_lighting(GOURAUD),
+)
+# msaa keeps the farthest sample's depth and covers pixels the center misses,
+# so only edge pixels may be off
+register_backend(
+    "msaa-depth",
+    "perspective-exact",
+    tolerance=255,
+    depth_tolerance=1.0,
+    max_bad=0.02,
+    msaa=True,
+)
+
+
+def _pose(pos, target):
+    # the camera looks at cam.dir * 10
+    return Camera(glm.vec3(pos), glm.vec3(target) / 10.0)
+
+
+# fixed poses over a 4x4 grid of cubes spanning 0..45 on x and z
+CASES = {
+    "front": _pose((22.5, -10, -30), (22.5, 0, 22.5)),
+    "corner": _pose((-25, -20, -25), (22.5, 0, 22.5)),
+    "close": _pose((12, -4, -8), (15, 0, 15)),
+    "above": _pose((22.5, -60, 10), (22.5, 0, 25)),
+    "lod": _pose((22.5, -10, -30), (22.5, 0, 22.5)),
+}
+
+
+def golden_scene():
+    return gen_cube_grid_scene(count=4)
+
+
+def lod_scene():
+    # the grid built from subdivided cubes with three detail levels. from the
+    # "lod" pose the cubes span 17 to 43 pixels, so the thresholds give the
+    # near row the full mesh, the next one level 1 and the far half level 2
+    levels = gen_lod_levels(subdivided_cube_mesh(4))
+    return gen_cube_grid_scene(count=4, mesh=LODMesh(levels, min_pixels=[32, 24]))
+
+
+# cases with a scene of their own, the rest use golden_scene()
+CASE_SCENES = {"lod": lod_scene}
+
+
+def case_scene(case):
+    return CASE_SCENES.get(case, golden_scene)()
+
+
+def render_case(backend, case, scene=None):
+    ctx = RenderContext(**BACKENDS[backend]["settings"])
+    fb = ctx.render(CASES[case].copy(), scene or case_scene(case))
+    return fb.color.copy(), fb.depth.astype(np.float32)
+
+
+def golden_path(golden_dir, backend, case):
+    return os.path.join(golden_dir, f"{backend}-{case}.npz")
+
+
+def save_golden(path, color, depth):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    np.savez_compressed(path, color=color, depth=depth)
+
+
+def load_golden(path):
+    with np.load(path) as data:
+        return data["color"], data["depth"]
+
+
+def compare(
+    color, depth, golden_color, golden_depth, tolerance=0, depth_tolerance=1e-5
+):
+    # bool mask of the pixels whose color or depth is off by more than allowed
+    color_error = np.abs(
+        unpack_rgb(color).astype(np.int16) - unpack_rgb(golden_color).astype(np.int16)
+    ).max(axis=2)
+    # inf == inf counts as equal, so untouched background matches
+    depth_ok = np.isclose(depth, golden_depth, rtol=0, atol=depth_tolerance)
+    return (color_error > tolerance) | ~depth_ok
+
+
+def diff_image(golden_color, bad):
+    # the golden dimmed to a quarter, with the failing pixels in red
+    rgb = unpack_rgb(golden_color) // 4
+    rgb[bad] = (255, 0, 0)
+    return pack_rgb(rgb)
+
+
+def save_image(path, color):
+    import pygame
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    surface = pygame.surfarray.make_surface(unpack_rgb(color).transpose(1, 0, 2))
+    pygame.image.save(surface, path)
+
+
+def record(backends, cases, golden_dir):
+    scenes = {case: case_scene(case) for case in cases}
+    for backend in backends:
+        if BACKENDS[backend]["golden"] != backend:
+            continue  # checked against another backend's goldens
+        for case in cases:
+            path = golden_path(golden_dir, backend, case)
+            save_golden(path, *render_case(backend, case, scenes[case]))
+            print(f"recorded {path}")
+
+
+def check(backends, cases, golden_dir, diff_dir=None):
+    scenes = {case: case_scene(case) for case in cases}
+    failures = 0
+    for backend in backends:
+        spec = BACKENDS[backend]
+        for case in cases:
+            path = golden_path(golden_dir, spec["golden"], case)
+            if not os.path.exists(path):
+                print(f"{backend:>17} {case:>8} missing {path}")
+                failures += 1
+                continue
+            start = time.perf_counter()
+            color, depth = render_case(backend, case, scenes[case])
+            seconds = time.perf_counter() - start
+            golden_color, golden_depth = load_golden(path)
+            if color.shape != golden_color.shape:
+                shapes = f"{color.shape} != {golden_color.shape}"
+                print(f"{backend:>17} {case:>8} size {shapes}")
+                failures += 1
+                continue
+            bad = compare(
+                color,
+                depth,
+                golden_color,
+                golden_depth,
+                spec["tolerance"],
+                spec["depth_tolerance"],
+            )
+            fraction = bad.mean()
+            ok = fraction <= spec["max_bad"]
+            failures += not ok
+            print(
+                f"{backend:>17} {case:>8} {'ok' if ok else 'FAIL':>4}"
+                f" {int(bad.sum()):>6} bad px ({fraction:.3%}) {seconds:.3f}s"
+            )
+            if diff_dir and bad.any():
+                name = f"{backend}-{case}"
+                save_image(
+                    os.path.join(diff_dir, f"{name}-diff.png"),
+                    diff_image(golden_color, bad),
+                )
+                save_image(os.path.join(diff_dir, f"{name}-out.png"), color)
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="compare rasterizer backends against stored golden images"
+    )
+    parser.add_argument("command", choices=["record", "check"])
+    parser.add_argument(
+        "--backends", nargs="+", choices=list(BACKENDS), default=list(BACKENDS)
+    )
+    parser.add_argument("--cases", nargs="+", choices=list(CASES), default=list(CASES))
+    parser.add_argument("--dir", default=GOLDEN_DIR, help="where the goldens live")
+    parser.add_argument(
+        "--diff-dir", help="write diff and output images of failures here"
+    )
+    args = parser.parse_args()
+
+    if args.command == "record":
+        record(args.backends, args.cases, args.dir)
+    elif check(args.backends, args.cases, args.dir, args.diff_dir):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
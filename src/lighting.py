@@ -0,0 +1,116 @@
+import numpy as np
+
+from .texture import pack_rgb, unpack_rgb
+
+FLAT = "flat"
+GOURAUD = "gouraud"
+MODES = (FLAT, GOURAUD)
+
+
+class DirectionalLight:
+    def __init__(self, direction, color=(1.0, 1.0, 1.0), intensity=1.0):
+        # direction the light travels in, world space
+        d = np.asarray(direction, np.float32)
+        self.direction = d / np.linalg.norm(d)
+        self.color = np.asarray(color, np.float32)
+        self.intensity = intensity
+
+    def signature(self):
+        return ("dir", *self.direction.tolist(), *self.color.tolist(), self.intensity)
+
+    def shade(self, normals, positions):
+        lambert = np.maximum(normals @ -self.direction, 0)
+        return lambert[..., None] * (self.color * self.intensity)
+
+
+class PointLight:
+    def __init__(self, pos, color=(1.0, 1.0, 1.0), intensity=1.0, radius=20.0):
+        self.pos = np.asarray(pos, np.float32)
+        self.color = np.asarray(color, np.float32)
+        self.intensity = intensity
+        # distance at which the light has fallen off to half
+        self.radius = radius
+
+    def signature(self):
+        return (
+            "point",
+            *self.pos.tolist(),
+            *self.color.tolist(),
+            self.intensity,
+            self.radius,
+        )
+
+    def shade(self, normals, positions):
+        to_light = self.pos - positions
+        dist = np.linalg.norm(to_light, axis=-1)
+        lambert = np.maximum(
+            np.einsum("...i,...i->...", normals, to_light) / np.maximum(dist, 1e-6), 0
+        )
+        falloff = 1 / (1 + (dist / self.radius) ** 2)
+        return (lambert * falloff)[..., None] * (self.color * self.intensity)
+
+
+class Lighting:
+    """Lights for a frame, evaluated with numpy over whole meshes at once.
+
+    FLAT lights every face once at its centroid, GOURAUD lights the vertices
+    and the rasterizer blends the three colors across the triangle. Either
+    way the result is one rgb multiplier per triangle corner, the per pixel
+    cost does not depend on the number of lights.
+    """
+
+    def __init__(self, lights=(), ambient=0.2, mode=FLAT):
+        if mode not in MODES:
+            raise ValueError(f"unknown lighting mode {mode!r}")
+        self.lights = list(lights)
+        self.ambient = ambient
+        self.mode = mode
+
+    def signature(self):
+        # changes whenever the lit result would, for reusing prepared frames
+        return (self.mode, self.ambient, *(l.signature() for l in self.lights))
+
+    def shade(self, normals, positions):
+        # (..., 3) world normals and positions -> (..., 3) rgb multipliers
+        rgb = np.full(normals.shape, self.ambient, np.float32)
+        for light in self.lights:
+            rgb += light.shade(normals, positions)
+        return rgb
+
+    def light_mesh(self, mesh, models):
+        # (n, 4, 4) model matrices -> (n, tris, 3 corners, 3) rgb multipliers
+        linear = models[:, :3, :3]
+        # normals go through the inverse transpose, scales need not be uniform
+        normal_matrices = np.linalg.inv(linear).transpose(0, 2, 1)
+        positions = mesh.vert_array[:, :3] @ linear.transpose(0, 2, 1)
+        positions += models[:, None, :3, 3]
+        if self.mode == FLAT:
+            normals = _normalize(mesh.face_normals @ normal_matrices.transpose(0, 2, 1))
+            centers = positions[:, mesh.tri_array].mean(axis=2)
+            rgb = self.shade(normals, centers)
+            return np.repeat(rgb[:, :, None], 3, axis=2)
+        normals = _normalize(mesh.vert_normals @ normal_matrices.transpose(0, 2, 1))
+        return self.shade(normals, positions)[:, mesh.tri_array]
+
+
+def _normalize(v):
+    return v / np.maximum(np.linalg.norm(v, axis=-1, keepdims=True), 1e-12)
+
+
+def default_lighting(mode=FLAT):
+    # a sun from above and slightly to the side, -y is up in world space
+    return Lighting([DirectionalLight((0.4, 1.0, 0.6))], ambient=0.3, mode=mode)
+
+
+def shade_texels(colors, rgb):
+    # shade_texel for an array of packed colors, rgb may be per texel arrays
+    lit = unpack_rgb(colors) * np.stack(np.broadcast_arrays(*rgb), axis=-1)
+    return pack_rgb(np.minimum(lit, 255))
+
+
+def shade_texel(color, rgb):
+    # packed 0xRRGGBB times an rgb multiplier, saturating at 255
+    r = min(int(((color >> 16) & 0xFF) * rgb[0]), 0xFF)
+    g = min(int(((color >> 8) & 0xFF) * rgb[1]), 0xFF)
+    b = min(int((color & 0xFF) * rgb[2]), 0xFF)
+    return (r << 16) | (g << 8) | b
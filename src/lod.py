@@ -0,0 +1,220 @@
+import heapq
+import itertools
+import math
+
+import glm
+
+from .mesh import Mesh
+
+
+def _plane_quadric(a, b, c):
+    # squared distance to the triangle's plane as a 4x4 quadric
+    n = glm.cross(b - a, c - a)
+    length = glm.length(n)
+    if length == 0:
+        return glm.dmat4(0)
+    n /= length
+    plane = glm.dvec4(glm.dvec3(n), -glm.dot(n, a))
+    return glm.outerProduct(plane, plane)
+
+
+def _quadric_error(q, v):
+    p = glm.dvec4(glm.dvec3(v), 1.0)
+    return glm.dot(p, q * p)
+
+
+def _signed_volume(verts, tris):
+    return sum(_tri_volume(*(verts[idx] for idx in tri)) for tri in tris)
+
+
+def _tri_volume(a, b, c):
+    return glm.dot(a, glm.cross(b, c)) / 6
+
+
+def _collapse(verts, tris, vert_tris, keep, drop, pos):
+    # the triangles around keep and drop after moving keep to pos and merging
+    # drop into it: (removed, changed, volume change), None when a surviving
+    # triangle would flip or degenerate
+    removed = []
+    changed = []
+    volume = 0.0
+    for index in vert_tris[keep] | vert_tris[drop]:
+        tri = tris[index]
+        a, b, c = (verts[idx] for idx in tri)
+        volume -= _tri_volume(a, b, c)
+        new = [keep if idx == drop else idx for idx in tri]
+        if len(set(new)) < 3:
+            removed.append(index)  # the collapse flattened it
+            continue
+        before = glm.cross(b - a, c - a)
+        a, b, c = (pos if idx == keep else verts[idx] for idx in new)
+        after = glm.cross(b - a, c - a)
+        flipped = glm.dot(before, after) <= 0
+        if flipped or glm.length(after) < 1e-6 * glm.length(before):
+            return None
+        volume += _tri_volume(a, b, c)
+        changed.append((index, new))
+    return removed, changed, volume
+
+
+def simplify(mesh, target_tris, max_error=0.02, max_volume_change=0.05):
+    # greedy edge collapse ordered by quadric error (Garland and Heckbert).
+    # collapses that move the surface more than max_error times the bounds
+    # diagonal, change the volume by more than max_volume_change, or flip or
+    # flatten a triangle are refused, so simplify may stop above target_tris.
+    # triangles keep their own uv triples, so collapses only stretch the texture
+    verts = [glm.vec3(v) for v in mesh.verts]
+    tris = [list(tri) for tri in mesh.tri_indices]
+    alive = [True] * len(tris)
+    vert_tris = [set() for _ in verts]
+    for index, tri in enumerate(tris):
+        for idx in tri:
+            vert_tris[idx].add(index)
+
+    quadrics = [glm.dmat4(0) for _ in verts]
+    for a, b, c in tris:
+        q = _plane_quadric(verts[a], verts[b], verts[c])
+        for idx in (a, b, c):
+            quadrics[idx] += q
+    tolerance = (max_error * glm.distance(*mesh.bounds)) ** 2
+    volume = _signed_volume(verts, tris)
+    current_volume = volume
+
+    # candidates live in a heap and go stale instead of being removed: each
+    # entry remembers the versions of its two vertices, bumped whenever one
+    # moves or dies. refused edges wait in `refused` until their neighborhood
+    # changes, which may make them safe
+    heap = []
+    version = [0] * len(verts)
+    refused = set()
+    sequence = itertools.count()
+
+    def neighbors(v):
+        return {idx for index in vert_tris[v] for idx in tris[index]} - {v}
+
+    def push(a, b):
+        a, b = min(a, b), max(a, b)
+        q = quadrics[a] + quadrics[b]
+        # equal errors (flat regions) go shortest edge first, which keeps the
+        # triangles even instead of fanning them around one vertex
+        length = glm.distance2(verts[a], verts[b])
+        for k, pos in enumerate((verts[a], verts[b], (verts[a] + verts[b]) * 0.5)):
+            error = _quadric_error(q, pos)
+            if error <= tolerance:
+                entry = (error, length, a, b, k, next(sequence))
+                heapq.heappush(heap, entry + (version[a], version[b], pos))
+
+    for a in range(len(verts)):
+        for b in neighbors(a):
+            if a < b:
+                push(a, b)
+
+    count = len(tris)
+    while count > target_tris and heap:
+        entry = heapq.heappop(heap)
+        keep, drop, _, _, keep_version, drop_version, pos = entry[2:]
+        if version[keep] != keep_version or version[drop] != drop_version:
+            continue
+        result = _collapse(verts, tris, vert_tris, keep, drop, pos)
+        if result is not None:
+            removed, changed, change = result
+            if abs(current_volume + change - volume) > max_volume_change * abs(volume):
+                result = None
+        if result is None:
+            refused.add((keep, drop))
+            continue
+
+        for index in removed:
+            alive[index] = False
+            for idx in tris[index]:
+                vert_tris[idx].discard(index)
+        for index, tri in changed:
+            tris[index] = tri
+            vert_tris[keep].add(index)
+        vert_tris[drop].clear()
+        count -= len(removed)
+        current_volume += change
+        verts[keep] = pos
+        quadrics[keep] = quadrics[keep] + quadrics[drop]
+        version[keep] += 1
+        version[drop] += 1
+
+        # new candidates for the edges of keep, and another chance for the
+        # refused edges whose triangles just changed
+        ring = neighbors(keep)
+        for idx in ring:
+            push(keep, idx)
+        for idx in ring:
+            for other in neighbors(idx):
+                edge = (min(idx, other), max(idx, other))
+                if edge in refused:
+                    refused.discard(edge)
+                    push(*edge)
+
+    # drop the triangles and vertices the collapses removed
+    tris = [tri for index, tri in enumerate(tris) if alive[index]]
+    tex_coords = [uv for index, uv in enumerate(mesh.tex_coords) if alive[index]]
+    remap = {}
+    new_verts = []
+    for tri in tris:
+        for idx in tri:
+            if idx not in remap:
+                remap[idx] = len(new_verts)
+                new_verts.append(verts[idx])
+    new_tris = [tuple(remap[idx] for idx in tri) for tri in tris]
+    return Mesh(new_verts, new_tris, tex_coords)
+
+
+def gen_lod_levels(mesh, count=3, ratio=0.5, min_tris=2):
+    # stops early once simplify cannot remove triangles within its tolerances,
+    # a mesh with no safe collapse (a cube) stays a single level
+    levels = [mesh]
+    for _ in range(count - 1):
+        prev = levels[-1]
+        target = max(int(len(prev.tri_indices) * ratio), min_tris)
+        if target >= len(prev.tri_indices):
+            break
+        level = simplify(prev, target)
+        if len(level.tri_indices) >= len(prev.tri_indices):
+            break
+        levels.append(level)
+    return levels
+
+
+class LODMesh:
+    """A mesh with several detail levels, level 0 being the full mesh.
+
+    min_pixels[i] is the smallest projected size in pixels at which level i
+    is still used, anything smaller than every threshold gets the last level.
+    """
+
+    def __init__(self, levels, min_pixels=None):
+        self.levels = levels
+        if min_pixels is None:
+            min_pixels = [8.0 / (2**i) for i in range(len(levels) - 1)]
+        self.min_pixels = min_pixels
+        # the coarse levels never leave the full mesh bounds by much, so the
+        # scene can keep using the detailed bounds for culling
+        self.bounds = levels[0].bounds
+
+    def select(self, pixels):
+        for level, threshold in zip(self.levels, self.min_pixels):
+            if pixels >= threshold:
+                return level
+        return self.levels[-1]
+
+
+def projected_size(bounds, eye, screen_scale):
+    # diameter in pixels of the bounding sphere around the bounds
+    lo, hi = bounds
+    center = (lo + hi) * 0.5
+    radius = glm.length(hi - lo) * 0.5
+    dist = glm.distance(center, eye)
+    if dist <= radius:
+        return float("inf")
+    return 2 * radius / dist * screen_scale
+
+
+def screen_scale(fov, height):
+    # pixels per unit of size at distance 1
+    return height / (2 * math.tan(math.radians(fov) / 2))
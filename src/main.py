@@ -1,342 +1,200 @@
-import math
+import argparse
 from pprint import pprint
 import pygame
 import glm
 
-pygame.init()
+from .camera import Camera
+from .context import RenderContext
+from .frame_server import FrameServer
+from .render import draw_frame, gen_cube_grid_scene
+from .shared_frames import FramePublisher
+from .scene import Scene
+from .trace import Tracer, span
+from .world import ChunkStreamer, World, default_meshes
 
-render_resolution = glm.vec2(240, 160)
-cut_factor = 1
-render_resolution /= cut_factor
-window_size = render_resolution * 4 * cut_factor
-texture_path = "./box.png"
 
+def mouse_pos(ctx):
+    return glm.vec2(pygame.mouse.get_pos()) / ctx.window_size * ctx.resolution
 
-def gen_cube_verts():
-    # return a list of vertices for a cube
-    s = 1.0  # half size
-    return [
-        glm.vec3(-s, -s, -s),
-        glm.vec3(s, -s, -s),
-        glm.vec3(s, s, -s),
-        glm.vec3(-s, s, -s),
-        glm.vec3(-s, -s, s),
-        glm.vec3(s, -s, s),
-        glm.vec3(s, s, s),
-        glm.vec3(-s, s, s),
-    ]
-
-
-def gen_cube_tri_indices():
-    # Define the triangles by the indices of their vertices
-    return [
-        (0, 1, 2),
-        (2, 3, 0),  # Front face
-        (1, 5, 6),
-        (6, 2, 1),  # Right face
-        (5, 4, 7),
-        (7, 6, 5),  # Back face
-        (4, 0, 3),
-        (3, 7, 4),  # Left face
-        (3, 2, 6),
-        (6, 7, 3),  # Top face
-        (4, 5, 1),
-        (1, 0, 4),  # Bottom face
-    ]
-
-
-def gen_cube_tex_coords():
-    # Define texture coordinates for each vertex
-    return [
-        # front face
-        ((0, 0), (1, 0), (1, 1)),
-        ((1, 1), (0, 1), (0, 0)),
-        # right face
-        ((0, 0), (1, 0), (1, 1)),
-        ((1, 1), (0, 1), (0, 0)),
-        # back face
-        ((0, 0), (1, 0), (1, 1)),
-        ((1, 1), (0, 1), (0, 0)),
-        # left face
-        ((0, 0), (1, 0), (1, 1)),
-        ((1, 1), (0, 1), (0, 0)),
-        # top face
-        ((0, 0), (1, 0), (1, 1)),
-        ((1, 1), (0, 1), (0, 0)),
-        # bottom face
-        ((0, 0), (1, 0), (1, 1)),
-        ((1, 1), (0, 1), (0, 0)),
-    ]
-
-
-def calc_normals(vertices, tri_indices):
-    normals = []
-    for tri in tri_indices:
-        # Get the vertices of the triangle
-        v0 = vertices[tri[0]]
-        v1 = vertices[tri[1]]
-        v2 = vertices[tri[2]]
-
-        # Calculate two edges of the triangle
-        edge1 = v1 - v0
-        edge2 = v2 - v0
-
-        # Calculate the cross product of the two edges
-        normal = glm.cross(edge1, edge2)
-
-        # Normalize the resulting vector
-        normal = glm.normalize(normal)
-
-        normals.append(normal)
-
-    return normals
-
-
-def transform(verts, tri_indices, pos, rot, scale, cam):
-    # Setup the Model matrix
-    model = glm.mat4(1)
-    model = glm.translate(model, pos)
-    model = glm.scale(model, scale)
-    model = glm.rotate(model, rot, glm.vec3(0, 1, 0))
-
-    # Setup the View matrix
-    view = glm.lookAt(cam.pos, cam.dir * 10.0, glm.vec3(0, -1, 0))
-
-    # Setup the Projection matrix
-    aspect_ratio = render_resolution.x / render_resolution.y
-    projection = glm.perspective(glm.radians(90.0), aspect_ratio, 0.1, 100.0)
-
-    # Generate the Model-View-Projection (MVP) matrix
-    mvp = projection * view * model
-
-    # Apply MVP to each vertex
-    transformed_verts = []
-    for vert in verts:
-        transformed_vert = mvp * glm.vec4(vert, 1.0)
-        # transformed_vert /= transformed_vert.w  # Perspective division
-        transformed_verts.append(glm.vec3(transformed_vert))
-
-    return transformed_verts
-
-
-def sample_texture(texture, uv):
-    uv = glm.vec2(uv[0] % 1, uv[1] % 1)
-    tex_y = int(uv.x * texture.get_height())
-    tex_x = int(uv.y * texture.get_width())
-
-    # clamp tex_y and tex_x
-    tex_y = min(max(tex_y, 0), texture.get_height() - 1)
-    tex_x = min(max(tex_x, 0), texture.get_width() - 1)
-
-    return texture.get_at((tex_x, tex_y))
-
-
-def barycentric(verts, p):
-    v0 = glm.vec2(verts[2]) - glm.vec2(verts[0])
-    v1 = glm.vec2(verts[1]) - glm.vec2(verts[0])
-    v2 = glm.vec2(p) - glm.vec2(verts[0])
-    d00 = glm.dot(v0, v0)
-    d01 = glm.dot(v0, v1)
-    d11 = glm.dot(v1, v1)
-    d20 = glm.dot(v2, v0)
-    d21 = glm.dot(v2, v1)
-    denom = d00 * d11 - d01 * d01 + 0.0001
-    u = (d11 * d20 - d01 * d21) / denom
-    v = (d00 * d21 - d01 * d20) / denom
-    return glm.vec3(u, v, 1 - u - v)
-
-
-def draw_texture_tri(surface, texture, verts, tex_coords, z_buffer):
-    min_x = min(v[0] for v in verts)
-    max_x = max(v[0] for v in verts)
-    min_y = min(v[1] for v in verts)
-    max_y = max(v[1] for v in verts)
-    # clamp min and max to surface size
-    min_x = max(min_x, 0)
-    min_y = max(min_y, 0)
-    max_x = min(max_x, surface.get_width() - 1)
-    max_y = min(max_y, surface.get_height() - 1)
-
-    for x in range(int(min_x), int(max_x) + 1):
-        for y in range(int(min_y), int(max_y) + 1):
-            p = glm.vec2(x, y)
-            bc = barycentric(verts, p)
-            if min(bc.x, bc.y, bc.z) < -0.001:
-                continue
-
-            uv = (
-                glm.vec3(*tex_coords[0], 0) * bc.x
-                + glm.vec3(*tex_coords[1], 0) * bc.y
-                + glm.vec3(*tex_coords[2], 0) * bc.z
-            )
-            depth = verts[0].z * bc.x + verts[1].z * bc.y + verts[2].z * bc.z
-            # if depth > 1:
-            #     continue
-            if (
-                depth < z_buffer[y][x]
-            ):  # If the current point is closer than the stored one
-                z_buffer[y][x] = depth  # Update the depth buffer
-                color = sample_texture(texture, uv.to_tuple())
-                surface.set_at((x, y), color)
-
-
-def draw_cube(
-    surface,
-    transformed_verts,
-    cube_tex_coords,
-    tri_indices,
-    normals,
-    texture,
-    z_buffer,
-):
-    # Convert the vertices from normalized device coordinates to window coordinates
-    transformed_verts = [
-        glm.vec3(
-            render_resolution.x * (v.x / v.z + 1) / 2,
-            render_resolution.y * (1 - (v.y / v.z + 1) / 2),
-            v.z,
-        )
-        for v in transformed_verts
-    ]
-    for i in range(len(tri_indices)):
-        if normals[i].z < 0:
-            draw_texture_tri(
-                surface,
-                texture,
-                [transformed_verts[idx] for idx in tri_indices[i]],
-                cube_tex_coords[i],
-                z_buffer,
-            )
-
-
-def mouse_pos():
-    return glm.vec2(pygame.mouse.get_pos()) / window_size * render_resolution
-
-
-def draw(surface, texture, z_buffer, cam):
-    # angle = pygame.time.get_ticks() / 1000.0
-    angle = 0
-    cube_verts = gen_cube_verts()
-    cube_tri_indices = gen_cube_tri_indices()
-    cube_tex_coords = gen_cube_tex_coords()
-
-    # draw a bunch of cubes
-    for z in range(0, 10):
-        for x in range(0, 10):
-            pos = glm.vec3(x * 15, 0, z * 15)
-            # pos = glm.vec3(0, 0, 0)
-            transformed_vertices = transform(
-                cube_verts,
-                cube_tri_indices,
-                pos,
-                angle,
-                glm.vec3(5, 5, 5),
-                cam,
-            )
-            normals = calc_normals(transformed_vertices, cube_tri_indices)
-            draw_cube(
-                surface,
-                transformed_vertices,
-                cube_tex_coords,
-                cube_tri_indices,
-                normals,
-                texture,
-                z_buffer,
-            )
 
+def draw_cursor(ctx, fb):
     rect_size = glm.vec2(16, 16)
-    center = render_resolution / 2
+    center = ctx.resolution / 2
     rect_pos = center - rect_size / 2 + glm.vec2(32, 32)
 
-    pygame.draw.circle(surface, (0, 255, 0), mouse_pos(), 3)
-
-
-class Camera:
-    def __init__(self, pos, dir):
-        self.pos = pos
-        self.dir = dir
-        self.yaw = 0.0
-        self.pitch = 0.0
-
-    def update(self, mouse_delta, speed=0.5):
-        # Update rotation angles
-        self.yaw -= mouse_delta[0] * speed
-        self.pitch += mouse_delta[1] * speed
+    pygame.draw.circle(fb.surface, (0, 255, 0), mouse_pos(ctx), 3)
 
-        # Constrain the pitch
-        self.pitch = max(-90, min(90, self.pitch))
 
-        # Normalize direction vector
-        self.dir = glm.normalize(self.dir)
-
-        # Calculate the new direction vector
-        dx = math.cos(math.radians(self.yaw)) * math.cos(math.radians(self.pitch))
-        dy = math.sin(math.radians(self.pitch))
-        dz = math.sin(math.radians(self.yaw)) * math.cos(math.radians(self.pitch))
-        self.dir = glm.vec3(dx, dy, dz)
-
-
-def main():
+def run(
+    ctx=None,
+    shared_frames_name=None,
+    frame_server_port=None,
+    trace_path=None,
+    trace_capacity=None,
+    world_path=None,
+):
+    # shared_frames_name: also publish every frame's color and depth to this
+    # shared memory ring, see shared_frames.FrameReader for the consumer side.
+    # frame_server_port: serve the frames over http on this local port, with
+    # SDL_VIDEODRIVER=dummy that is the way to watch a headless run.
+    # trace_path: write a Chrome trace of the render stages there on exit,
+    # keeping only the last trace_capacity events if given.
+    # world_path: stream the scene from this chunked world file (see world.py)
+    # around the camera instead of building the cube grid
+    if ctx is None:
+        ctx = RenderContext(pipelined=True)
+    if trace_path is not None:
+        ctx.tracer = Tracer(trace_capacity)
+    tracer = ctx.tracer
+    window = ctx.open_window()
     pygame.mouse.set_visible(False)  # Hide the cursor
     pygame.event.set_grab(True)  # Keep the mouse inside the window
 
-    window = pygame.display.set_mode(window_size.to_tuple())
-    render_surface = pygame.Surface(render_resolution.to_tuple())
-    texture = pygame.image.load(texture_path)
-
-    cam = Camera(glm.vec3(0, 0, -20), glm.vec3(0, 0, 0))
-    running = True
-    while running:
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT or (
-                event.type == pygame.KEYDOWN and (event.key == pygame.K_ESCAPE)
-            ):
-                running = False
-
-        pressed = pygame.key.get_pressed()
-        speed = 1.0
-        if pressed[pygame.K_w]:
-            cam.pos += glm.normalize(cam.dir - cam.pos) * speed
-        if pressed[pygame.K_s]:
-            cam.pos -= glm.normalize(cam.dir - cam.pos) * speed
-        if pressed[pygame.K_a]:
-            right = glm.cross(glm.normalize(cam.dir - cam.pos), glm.vec3(0, 1, 0))
-            cam.pos += glm.normalize(right) * speed
-        if pressed[pygame.K_d]:
-            right = glm.cross(glm.normalize(cam.dir - cam.pos), glm.vec3(0, 1, 0))
-            cam.pos -= glm.normalize(right) * speed
-        if pressed[pygame.K_SPACE]:
-            cam.pos -= glm.vec3(0, 1, 0) * speed
-        if pressed[pygame.K_LSHIFT] or pressed[pygame.K_RSHIFT]:
-            cam.pos += glm.vec3(0, 1, 0) * speed
+    fb = ctx.fb
+    streamer = None
+    if world_path is None:
+        scene = gen_cube_grid_scene()
+    else:
+        scene = Scene()
+        streamer = ChunkStreamer(World(world_path), scene, default_meshes())
+    publisher = None
+    if shared_frames_name is not None:
+        publisher = FramePublisher(shared_frames_name, fb.width, fb.height, depth=True)
+    server = None
+    if frame_server_port is not None:
+        server = FrameServer(port=frame_server_port).start()
+
+    try:
+        cam = Camera(glm.vec3(0, 0, -20), glm.vec3(0, 0, 0))
+        running = True
+        while running:
+            with span(tracer, "frame"):
+                with span(tracer, "input"):
+                    for event in pygame.event.get():
+                        if event.type == pygame.QUIT or (
+                            event.type == pygame.KEYDOWN
+                            and (event.key == pygame.K_ESCAPE)
+                        ):
+                            running = False
+
+                    pressed = pygame.key.get_pressed()
+                    mouse_delta = pygame.mouse.get_rel()
+
+                with span(tracer, "camera"):
+                    speed = 1.0
+                    if pressed[pygame.K_w]:
+                        cam.pos += glm.normalize(cam.dir - cam.pos) * speed
+                    if pressed[pygame.K_s]:
+                        cam.pos -= glm.normalize(cam.dir - cam.pos) * speed
+                    if pressed[pygame.K_a]:
+                        right = glm.cross(
+                            glm.normalize(cam.dir - cam.pos), glm.vec3(0, 1, 0)
+                        )
+                        cam.pos += glm.normalize(right) * speed
+                    if pressed[pygame.K_d]:
+                        right = glm.cross(
+                            glm.normalize(cam.dir - cam.pos), glm.vec3(0, 1, 0)
+                        )
+                        cam.pos -= glm.normalize(right) * speed
+                    if pressed[pygame.K_SPACE]:
+                        cam.pos -= glm.vec3(0, 1, 0) * speed
+                    if pressed[pygame.K_LSHIFT] or pressed[pygame.K_RSHIFT]:
+                        cam.pos += glm.vec3(0, 1, 0) * speed
+
+                    cam.update(mouse_delta)
+
+                if streamer is not None:
+                    # the scene must not change under a frame still being prepared
+                    with span(tracer, "wait geometry"):
+                        ctx.wait_prepared()
+                    with span(tracer, "stream"):
+                        streamer.update(cam.pos)
+
+                # pipelined contexts show the frame prepared last time around, the
+                # wait is how long rasterizing the previous frame did not cover
+                with span(tracer, "wait geometry"):
+                    frame = ctx.next_frame(cam, scene)
+                with fb:
+                    with span(tracer, "draw"):
+                        fb.clear()
+                        draw_frame(ctx, fb, frame)
+                    with span(tracer, "publish"):
+                        if publisher is not None:
+                            publisher.publish(fb.color, fb.depth)
+                        if server is not None:
+                            server.publish(fb.color)
+                    draw_cursor(ctx, fb)
+
+                with span(tracer, "scale"):
+                    stretched_surface = pygame.transform.scale(
+                        fb.surface, ctx.window_size
+                    )
+                    window.blit(stretched_surface, (0, 0))
+
+                # draw the cam pos and dir via text in tl
+                size = 24
+                font = pygame.font.SysFont("Arial", size)
+                pos_text = font.render(f"pos: {cam.pos}", True, (255, 255, 255))
+                dir_text = font.render(f"dir: {cam.dir}", True, (255, 255, 255))
+                y_cursor = 0
+                window.blit(pos_text, (0, y_cursor))
+                y_cursor += size
+                window.blit(dir_text, (0, y_cursor))
+
+                with span(tracer, "present"):
+                    pygame.display.update()
+    finally:
+        # also on ctrl-c, the only way to stop a headless run
+        ctx.close()
+        if streamer is not None:
+            streamer.close()
+            streamer.world.close()
+        if trace_path is not None:
+            tracer.dump(trace_path)
+        if publisher is not None:
+            publisher.close()
+        if server is not None:
+            server.stop()
+        pygame.quit()
 
-        mouse_delta = pygame.mouse.get_rel()
-        cam.update(mouse_delta)
 
-        z_buffer = [
-            [float("inf")] * int(render_resolution.x)
-            for _ in range(int(render_resolution.y))
-        ]
-        render_surface.fill((0, 0, 0))
-
-        draw(render_surface, texture, z_buffer, cam)
-
-        stretched_surface = pygame.transform.scale(render_surface, window_size)
-        window.blit(stretched_surface, (0, 0))
-
-        # draw the cam pos and dir via text in tl
-        size = 24
-        font = pygame.font.SysFont("Arial", size)
-        pos_text = font.render(f"pos: {cam.pos}", True, (255, 255, 255))
-        dir_text = font.render(f"dir: {cam.dir}", True, (255, 255, 255))
-        y_cursor = 0
-        window.blit(pos_text, (0, y_cursor))
-        y_cursor += size
-        window.blit(dir_text, (0, y_cursor))
-
-        pygame.display.update()
-
-    pygame.quit()
+def main():
+    parser = argparse.ArgumentParser(description="interactive software renderer")
+    parser.add_argument(
+        "--world",
+        dest="world_path",
+        metavar="PATH",
+        help="stream the scene from this chunked world file (python -m src.world)",
+    )
+    parser.add_argument(
+        "--shared-frames",
+        dest="shared_frames_name",
+        metavar="NAME",
+        help="also publish every frame to this shared memory ring",
+    )
+    parser.add_argument(
+        "--serve",
+        dest="frame_server_port",
+        type=int,
+        metavar="PORT",
+        help="serve the frames over http on this local port",
+    )
+    parser.add_argument(
+        "--trace",
+        dest="trace_path",
+        metavar="PATH",
+        help="write a Chrome trace of the render stages here on exit",
+    )
+    parser.add_argument(
+        "--trace-capacity",
+        type=int,
+        metavar="N",
+        help="keep only the last N trace events",
+    )
+    args = parser.parse_args()
+    if args.trace_capacity is not None and args.trace_path is None:
+        parser.error("--trace-capacity needs --trace")
+    run(**vars(args))
 
 
 if __name__ == "__main__":
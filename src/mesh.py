@@ -0,0 +1,156 @@
+import glm
+import numpy as np
+
+
+def gen_cube_verts():
+    # return a list of vertices for a cube
+    s = 1.0  # half size
+    return [
+        glm.vec3(-s, -s, -s),
+        glm.vec3(s, -s, -s),
+        glm.vec3(s, s, -s),
+        glm.vec3(-s, s, -s),
+        glm.vec3(-s, -s, s),
+        glm.vec3(s, -s, s),
+        glm.vec3(s, s, s),
+        glm.vec3(-s, s, s),
+    ]
+
+
+def gen_cube_tri_indices():
+    # Define the triangles by the indices of their vertices
+    return [
+        (0, 1, 2),
+        (2, 3, 0),  # Front face
+        (1, 5, 6),
+        (6, 2, 1),  # Right face
+        (5, 4, 7),
+        (7, 6, 5),  # Back face
+        (4, 0, 3),
+        (3, 7, 4),  # Left face
+        (3, 2, 6),
+        (6, 7, 3),  # Top face
+        (4, 5, 1),
+        (1, 0, 4),  # Bottom face
+    ]
+
+
+def gen_cube_tex_coords():
+    # Define texture coordinates for each vertex
+    return [
+        # front face
+        ((0, 0), (1, 0), (1, 1)),
+        ((1, 1), (0, 1), (0, 0)),
+        # right face
+        ((0, 0), (1, 0), (1, 1)),
+        ((1, 1), (0, 1), (0, 0)),
+        # back face
+        ((0, 0), (1, 0), (1, 1)),
+        ((1, 1), (0, 1), (0, 0)),
+        # left face
+        ((0, 0), (1, 0), (1, 1)),
+        ((1, 1), (0, 1), (0, 0)),
+        # top face
+        ((0, 0), (1, 0), (1, 1)),
+        ((1, 1), (0, 1), (0, 0)),
+        # bottom face
+        ((0, 0), (1, 0), (1, 1)),
+        ((1, 1), (0, 1), (0, 0)),
+    ]
+
+
+def calc_bounds(points):
+    lo = glm.vec3(points[0])
+    hi = glm.vec3(points[0])
+    for p in points[1:]:
+        lo = glm.min(lo, p)
+        hi = glm.max(hi, p)
+    return lo, hi
+
+
+def box_corners(lo, hi):
+    return [
+        glm.vec3(x, y, z)
+        for x in (lo.x, hi.x)
+        for y in (lo.y, hi.y)
+        for z in (lo.z, hi.z)
+    ]
+
+
+def calc_mesh_normals(points, tris):
+    # unit face normals and area weighted vertex normals as float32 arrays
+    v0 = points[tris[:, 0]]
+    cross = np.cross(points[tris[:, 1]] - v0, points[tris[:, 2]] - v0)
+    # the winding is not fixed, make closed meshes face outwards (a positive
+    # signed volume), open ones keep what the winding says
+    if np.einsum("ij,ij->", v0, cross) < 0:
+        cross = -cross
+    vert_normals = np.zeros_like(points)
+    for i in range(3):
+        np.add.at(vert_normals, tris[:, i], cross)
+    return _normalize(cross), _normalize(vert_normals)
+
+
+def _normalize(v):
+    length = np.linalg.norm(v, axis=-1, keepdims=True)
+    return (v / np.maximum(length, 1e-12)).astype(np.float32)
+
+
+class Mesh:
+    def __init__(self, verts, tri_indices, tex_coords):
+        self.verts = verts
+        self.tri_indices = tri_indices
+        # one uv triple per triangle, same layout as gen_cube_tex_coords
+        self.tex_coords = tex_coords
+        self.bounds = calc_bounds(verts)
+        # homogeneous float32 copies for the vectorized vertex stage
+        self.vert_array = np.array([(v.x, v.y, v.z, 1.0) for v in verts], np.float32)
+        self.tri_array = np.array(tri_indices, np.intp).reshape(-1, 3)
+        self.uv_array = np.array(tex_coords, np.float32).reshape(-1, 3, 2)
+        # model space normals for lighting, computed once per mesh
+        self.face_normals, self.vert_normals = calc_mesh_normals(
+            self.vert_array[:, :3], self.tri_array
+        )
+
+
+def cube_mesh():
+    return Mesh(gen_cube_verts(), gen_cube_tri_indices(), gen_cube_tex_coords())
+
+
+def subdivided_cube_mesh(n):
+    # the cube with every face split into n x n quads that share vertices,
+    # same winding and uv layout as cube_mesh, so it looks the same but gives
+    # simplify something to remove
+    corners = gen_cube_verts()
+    cube_tris = gen_cube_tri_indices()
+    verts = []
+    index = {}
+    tri_indices = []
+    tex_coords = []
+
+    def vert(p):
+        key = (round(p.x, 6), round(p.y, 6), round(p.z, 6))
+        if key not in index:
+            index[key] = len(verts)
+            verts.append(glm.vec3(key))
+        return index[key]
+
+    # each face is two triangles (a, b, c) and (c, d, a) with uvs (0, 0),
+    # (1, 0), (1, 1) and (0, 1) at a, b, c and d
+    for (a, b, c), (_, d, _) in zip(cube_tris[::2], cube_tris[1::2]):
+        origin = corners[a]
+        du = corners[b] - origin
+        dv = corners[d] - origin
+        for i in range(n):
+            for j in range(n):
+                u0, u1, v0, v1 = i / n, (i + 1) / n, j / n, (j + 1) / n
+                p00 = vert(origin + du * u0 + dv * v0)
+                p10 = vert(origin + du * u1 + dv * v0)
+                p11 = vert(origin + du * u1 + dv * v1)
+                p01 = vert(origin + du * u0 + dv * v1)
+                tri_indices += [(p00, p10, p11), (p11, p01, p00)]
+                tex_coords += [
+                    ((u0, v0), (u1, v0), (u1, v1)),
+                    ((u1, v1), (u0, v1), (u0, v0)),
+                ]
+    return Mesh(verts, tri_indices, tex_coords)
@@ -0,0 +1,39 @@
+from concurrent.futures import ThreadPoolExecutor
+
+
+class FramePipeline:
+    """Runs a frame's geometry stage on a worker thread, one frame ahead.
+
+    swap() hands back the frame prepared from the previous call's arguments
+    and starts preparing the next one, so the caller rasterizes frame N while
+    frame N + 1 is transformed and culled. At most two frames are alive at
+    once, the one being drawn and the one being prepared. Everything passed in
+    must stay untouched until the next swap(), copy the camera for that.
+    """
+
+    def __init__(self, prepare):
+        self.prepare = prepare
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="geometry")
+        self.pending = None
+
+    def swap(self, *args):
+        if self.pending is None:
+            self.pending = self.executor.submit(self.prepare, *args)
+        frame = self.pending.result()
+        self.pending = self.executor.submit(self.prepare, *args)
+        return frame
+
+    def wait(self):
+        # blocks until the frame being prepared is done, it is kept for swap()
+        if self.pending is not None:
+            self.pending.result()
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        self.pending = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
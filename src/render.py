@@ -0,0 +1,449 @@
+import math
+
+import glm
+import numpy as np
+
+from .lighting import shade_texel, shade_texels
+from .lod import LODMesh, projected_size, screen_scale
+from .mesh import cube_mesh
+from .render_queue import RenderQueue
+from .scene import (
+    Instance,
+    Scene,
+    depth_occlusion_test,
+    model_matrices,
+)
+from .texture import NEAREST
+from .texture_manager import TextureHandle
+from .trace import span
+from .triangles import TriangleBuffer, screen_vertices
+
+
+def view_projection(ctx, cam):
+    # the camera caches its matrices, this only rebuilds them when the lens
+    # settings of the context changed since the last call
+    aspect_ratio = ctx.resolution.x / ctx.resolution.y
+    cam.set_lens(ctx.fov, aspect_ratio)
+    return cam.view_proj
+
+
+def sample_texture(texture, uv):
+    uv = glm.vec2(uv[0] % 1, uv[1] % 1)
+    tex_y = int(uv.x * texture.get_height())
+    tex_x = int(uv.y * texture.get_width())
+
+    # clamp tex_y and tex_x
+    tex_y = min(max(tex_y, 0), texture.get_height() - 1)
+    tex_x = min(max(tex_x, 0), texture.get_width() - 1)
+
+    return int(texture.fetch(tex_x, tex_y))
+
+
+def barycentric(verts, p):
+    v0 = glm.vec2(verts[2]) - glm.vec2(verts[0])
+    v1 = glm.vec2(verts[1]) - glm.vec2(verts[0])
+    v2 = glm.vec2(p) - glm.vec2(verts[0])
+    d00 = glm.dot(v0, v0)
+    d01 = glm.dot(v0, v1)
+    d11 = glm.dot(v1, v1)
+    d20 = glm.dot(v2, v0)
+    d21 = glm.dot(v2, v1)
+    denom = d00 * d11 - d01 * d01 + 0.0001
+    u = (d11 * d20 - d01 * d21) / denom
+    v = (d00 * d21 - d01 * d20) / denom
+    return glm.vec3(u, v, 1 - u - v)
+
+
+def _corner_weights(bc, shade):
+    # rgb at a pixel from the three corner colors. unlike the uvs these are
+    # paired with the vertex each barycentric() weight really belongs to
+    return (
+        shade[2][0] * bc[0] + shade[1][0] * bc[1] + shade[0][0] * bc[2],
+        shade[2][1] * bc[0] + shade[1][1] * bc[1] + shade[0][1] * bc[2],
+        shade[2][2] * bc[0] + shade[1][2] * bc[1] + shade[0][2] * bc[2],
+    )
+
+
+def draw_texture_tri(fb, texture, verts, tex_coords, shade=None):
+    # shade: optional rgb multiplier per vertex, blended across the triangle
+    flat = shade is not None and shade[0] == shade[1] == shade[2]
+    min_x = min(v[0] for v in verts)
+    max_x = max(v[0] for v in verts)
+    min_y = min(v[1] for v in verts)
+    max_y = max(v[1] for v in verts)
+    # clamp min and max to surface size
+    min_x = max(min_x, 0)
+    min_y = max(min_y, 0)
+    max_x = min(max_x, fb.width - 1)
+    max_y = min(max_y, fb.height - 1)
+
+    for x in range(int(min_x), int(max_x) + 1):
+        for y in range(int(min_y), int(max_y) + 1):
+            p = glm.vec2(x, y)
+            bc = barycentric(verts, p)
+            if min(bc.x, bc.y, bc.z) < -0.001:
+                continue
+
+            uv = (
+                glm.vec3(*tex_coords[0], 0) * bc.x
+                + glm.vec3(*tex_coords[1], 0) * bc.y
+                + glm.vec3(*tex_coords[2], 0) * bc.z
+            )
+            depth = verts[0].z * bc.x + verts[1].z * bc.y + verts[2].z * bc.z
+            # if depth > 1:
+            #     continue
+            if (
+                depth < fb.depth[y][x]
+            ):  # If the current point is closer than the stored one
+                fb.depth[y][x] = depth  # Update the depth buffer
+                color = sample_texture(texture, uv.to_tuple())
+                if shade is not None:
+                    rgb = shade[0] if flat else _corner_weights(bc, shade)
+                    color = shade_texel(color, rgb)
+                fb.color[y][x] = color
+
+
+def _row_range(start, step, min_x, max_x):
+    # clip a row to the pixels inside all three edges, empty when lo > hi
+    lo = min_x
+    hi = max_x
+    for b0, s in zip(start, step):
+        if s > 0:
+            lo = max(lo, min_x + math.ceil((-0.001 - b0) / s))
+        elif s < 0:
+            hi = min(hi, min_x + math.floor((-0.001 - b0) / s))
+        elif b0 < -0.001:
+            hi = lo - 1
+    return lo, hi
+
+
+def draw_texture_tri_perspective(fb, texture, verts, tex_coords, span, shade=None):
+    if min(v.z for v in verts) <= 0:
+        # no usable 1/w behind the camera, fall back to affine uvs
+        draw_texture_tri(fb, texture, verts, tex_coords, shade)
+        return
+    flat = shade is not None and shade[0] == shade[1] == shade[2]
+
+    min_x = max(int(min(v[0] for v in verts)), 0)
+    max_x = min(int(max(v[0] for v in verts)), fb.width - 1)
+    min_y = max(int(min(v[1] for v in verts)), 0)
+    max_y = min(int(max(v[1] for v in verts)), fb.height - 1)
+
+    # barycentric() weights (x, y, z) belong to verts (2, 1, 0), while
+    # draw_texture_tri pairs them with tex_coords (0, 1, 2). u/w, v/w and 1/w
+    # are kept on that same pairing so both paths agree when w is constant
+    inv_w = (1 / verts[2].z, 1 / verts[1].z, 1 / verts[0].z)
+    u_w = [tex_coords[i][0] * inv_w[i] for i in range(3)]
+    v_w = [tex_coords[i][1] * inv_w[i] for i in range(3)]
+    depths = (verts[0].z, verts[1].z, verts[2].z)
+
+    def exact_uv(b):
+        q = b[0] * inv_w[0] + b[1] * inv_w[1] + b[2] * inv_w[2]
+        u = b[0] * u_w[0] + b[1] * u_w[1] + b[2] * u_w[2]
+        v = b[0] * v_w[0] + b[1] * v_w[1] + b[2] * v_w[2]
+        return u / q, v / q
+
+    for y in range(min_y, max_y + 1):
+        # the weights are linear along the row, so step them instead of
+        # calling barycentric() per pixel
+        start = barycentric(verts, glm.vec2(min_x, y))
+        step = barycentric(verts, glm.vec2(min_x + 1, y)) - start
+        lo, hi = _row_range(start, step, min_x, max_x)
+        if lo > hi:
+            continue
+
+        z_row = fb.depth[y]
+        color_row = fb.color[y]
+        for x0 in range(lo, hi + 1, span):
+            x1 = min(x0 + span, hi)
+            b0 = start + step * (x0 - min_x)
+            b1 = start + step * (x1 - min_x)
+            u0, v0 = exact_uv(b0)
+            u1, v1 = exact_uv(b1)
+            z0 = b0[0] * depths[0] + b0[1] * depths[1] + b0[2] * depths[2]
+            z1 = b1[0] * depths[0] + b1[1] * depths[1] + b1[2] * depths[2]
+
+            # affine in between the exact samples
+            n = max(x1 - x0, 1)
+            du = (u1 - u0) / n
+            dv = (v1 - v0) / n
+            dz = (z1 - z0) / n
+            if shade is not None and not flat:
+                # gouraud colors step across the span like the depth does
+                s0 = _corner_weights(b0, shade)
+                s1 = _corner_weights(b1, shade)
+                ds = [(s1[k] - s0[k]) / n for k in range(3)]
+            for i in range(min(span, hi - x0 + 1)):
+                x = x0 + i
+                depth = z0 + dz * i
+                if depth < z_row[x]:
+                    z_row[x] = depth
+                    color = sample_texture(texture, (u0 + du * i, v0 + dv * i))
+                    if flat:
+                        color = shade_texel(color, shade[0])
+                    elif shade is not None:
+                        rgb = (s0[0] + ds[0] * i, s0[1] + ds[1] * i, s0[2] + ds[2] * i)
+                        color = shade_texel(color, rgb)
+                    color_row[x] = color
+
+
+def _uv_setup(tris, i):
+    # same weight pairing as draw_texture_tri_perspective, affine uvs when
+    # part of the triangle is behind the camera
+    inv_w = tris.inv_w[i].tolist()
+    if min(inv_w) > 0:
+        inv_w = (inv_w[2], inv_w[1], inv_w[0])
+    else:
+        inv_w = (1.0, 1.0, 1.0)
+    u = tris.u[i].tolist()
+    v = tris.v[i].tolist()
+    u_w = [u[k] * inv_w[k] for k in range(3)]
+    v_w = [v[k] * inv_w[k] for k in range(3)]
+    return inv_w, u_w, v_w
+
+
+def _uv_at(b, inv_w, u_w, v_w):
+    # perspective correct uvs for arrays of barycentric weights
+    q = b[0] * inv_w[0] + b[1] * inv_w[1] + b[2] * inv_w[2]
+    u = (b[0] * u_w[0] + b[1] * u_w[1] + b[2] * u_w[2]) / q
+    v = (b[0] * v_w[0] + b[1] * v_w[1] + b[2] * v_w[2]) / q
+    return u, v
+
+
+def draw_texture_tri_rows(fb, tris, i, sampler):
+    # a row at a time with numpy: exact perspective uvs for every pixel, one
+    # vectorized depth test and one sampler(texture, u, v) call per row
+    xs = tris.x[i].tolist()
+    ys = tris.y[i].tolist()
+    min_x = max(int(min(xs)), 0)
+    max_x = min(int(max(xs)), fb.width - 1)
+    min_y = max(int(min(ys)), 0)
+    max_y = min(int(max(ys)), fb.height - 1)
+
+    texture = tris.texture(i)
+    uv_setup = _uv_setup(tris, i)
+    depths = tris.z[i].tolist()
+    shade = tris.corner_shade(i)
+    flat = shade is not None and shade[0] == shade[1] == shade[2]
+    origin, step_x, step_y = (a[i].tolist() for a in tris.setup())
+
+    for y in range(min_y, max_y + 1):
+        start = [origin[k] + step_y[k] * y + step_x[k] * min_x for k in range(3)]
+        lo, hi = _row_range(start, step_x, min_x, max_x)
+        if lo > hi:
+            continue
+
+        t = np.arange(lo - min_x, hi - min_x + 1, dtype=np.float64)
+        b = [start[k] + step_x[k] * t for k in range(3)]
+        depth = b[0] * depths[0] + b[1] * depths[1] + b[2] * depths[2]
+        z_seg = fb.depth[y, lo : hi + 1]
+        mask = depth < z_seg
+        if not mask.any():
+            continue
+        b = [w[mask] for w in b]
+        colors = sampler(texture, *_uv_at(b, *uv_setup))
+        if shade is not None:
+            rgb = shade[0] if flat else _corner_weights(b, shade)
+            colors = shade_texels(colors, rgb)
+        z_seg[mask] = depth[mask]
+        fb.color[y, lo : hi + 1][mask] = colors
+
+
+def draw_texture_tri_msaa(fb, tris, i, sampler):
+    # coverage and depth are tested at every sub-sample of fb, the texture is
+    # sampled once per pixel at its center and stored into the samples that
+    # passed. fb.resolve() averages them into the color buffer afterwards
+    xs = tris.x[i].tolist()
+    ys = tris.y[i].tolist()
+    min_x = max(math.floor(min(xs) - 0.5), 0)
+    max_x = min(math.ceil(max(xs) + 0.5), fb.width - 1)
+    min_y = max(math.floor(min(ys) - 0.5), 0)
+    max_y = min(math.ceil(max(ys) + 0.5), fb.height - 1)
+    if min_x > max_x or min_y > max_y:
+        return
+
+    texture = tris.texture(i)
+    uv_setup = _uv_setup(tris, i)
+    depths = tris.z[i].tolist()
+    shade = tris.corner_shade(i)
+    flat = shade is not None and shade[0] == shade[1] == shade[2]
+
+    # the weights are linear in screen space, so every sample position is a
+    # fixed offset from the pixel's own weights. the whole bounding box is
+    # tested at once, as (rows, columns, samples) arrays
+    origin, step_x, step_y = (a[i].tolist() for a in tris.setup())
+    offsets = [
+        np.array([step_x[k] * dx + step_y[k] * dy for dx, dy in fb.sample_offsets])
+        for k in range(3)
+    ]
+    rows = np.arange(min_y, max_y + 1, dtype=np.float64)[:, None]
+    t = np.arange(max_x - min_x + 1, dtype=np.float64)
+    b = [
+        origin[k] + step_y[k] * rows + step_x[k] * min_x + step_x[k] * t
+        for k in range(3)
+    ]
+    w = [b[k][..., None] + offsets[k] for k in range(3)]
+    mask = (w[0] >= -0.001) & (w[1] >= -0.001) & (w[2] >= -0.001)
+    depth = w[0] * depths[0] + w[1] * depths[1] + w[2] * depths[2]
+    box = (slice(min_y, max_y + 1), slice(min_x, max_x + 1))
+    z_samples = fb.sample_depth[box]
+    mask &= depth < z_samples
+    shaded = mask.any(axis=2)
+    if not shaded.any():
+        return
+    z_samples[mask] = depth[mask]
+
+    center = [plane[shaded] for plane in b]
+    colors = sampler(texture, *_uv_at(center, *uv_setup))
+    if shade is not None:
+        rgb = shade[0] if flat else _corner_weights(center, shade)
+        colors = shade_texels(colors, rgb)
+    pixel_colors = np.zeros(shaded.shape, np.uint32)
+    pixel_colors[shaded] = colors
+    sample_colors = np.broadcast_to(pixel_colors[..., None], mask.shape)
+    fb.sample_color[box][mask] = sample_colors[mask]
+    # the farthest sample, keeps the occlusion test conservative
+    fb.depth[box][shaded] = z_samples[shaded].max(axis=1)
+
+
+def texture_sampler(ctx, batched=False):
+    # the batch sampler for the numpy rasterizers. None (unless batched) for
+    # plain nearest filtering, which keeps the per pixel rasterizers
+    address = ctx.texture_address
+    if ctx.texture_filter != NEAREST:
+        return lambda texture, u, v: texture.sample_bilinear(u, v, address)
+    if batched:
+        return lambda texture, u, v: texture.sample(u, v, address)
+    return None
+
+
+def draw_triangles(ctx, fb, tris, first=0, last=None):
+    # rows first:last of a TriangleBuffer with the backend ctx asks for
+    if last is None:
+        last = len(tris)
+    msaa = fb.samples > 1
+    sampler = texture_sampler(ctx, batched=msaa)
+    for i in range(first, last):
+        if msaa:
+            draw_texture_tri_msaa(fb, tris, i, sampler)
+        elif sampler is not None:
+            draw_texture_tri_rows(fb, tris, i, sampler)
+        elif ctx.perspective_span > 0:
+            draw_texture_tri_perspective(
+                fb,
+                tris.texture(i),
+                tris.verts(i),
+                tris.tex_coords(i),
+                ctx.perspective_span,
+                tris.corner_shade(i),
+            )
+        else:
+            draw_texture_tri(
+                fb,
+                tris.texture(i),
+                tris.verts(i),
+                tris.tex_coords(i),
+                tris.corner_shade(i),
+            )
+
+
+def gen_cube_grid_scene(count=10, spacing=15, mesh=None):
+    # angle = pygame.time.get_ticks() / 1000.0
+    angle = 0
+    # 12 triangles have nothing to simplify, the plain cube is always drawn in
+    # full. pass an LODMesh to have the grid pick levels
+    if mesh is None:
+        mesh = cube_mesh()
+    scene = Scene()
+    for z in range(0, count):
+        for x in range(0, count):
+            pos = glm.vec3(x * spacing, 0, z * spacing)
+            scene.add(Instance(mesh, pos, angle, glm.vec3(5, 5, 5)))
+    return scene
+
+
+def prepare_frame(ctx, texture, cam, scene):
+    # geometry stage: culling, lod, sorting and vertex transforms. it only
+    # reads its arguments, so it can run ahead on another thread
+    view_proj = view_projection(ctx, cam)
+    view = cam.view
+    scale = screen_scale(ctx.fov, ctx.resolution.y)
+
+    # only the instances whose bounds touch the view frustum get queued
+    queue = RenderQueue()
+    with span(ctx.tracer, "cull"):
+        for inst in scene.query_frustum(cam.frustum_planes):
+            mesh = inst.mesh
+            inst_texture = inst.texture or texture
+            handle = isinstance(inst_texture, TextureHandle)
+            if isinstance(mesh, LODMesh) or handle:
+                pixels = projected_size(inst.bounds, cam.pos, scale)
+                if isinstance(mesh, LODMesh):
+                    mesh = mesh.select(pixels)
+                if handle:
+                    # picks a mip level, still decoding draws the default texture
+                    inst_texture = inst_texture.get(pixels) or texture
+            center = (inst.bounds[0] + inst.bounds[1]) * 0.5
+            depth = -(view * glm.vec4(center, 1.0)).z
+            queue.submit(inst, mesh, inst_texture, depth)
+
+    # one numpy pass per mesh over every instance using it: clip space,
+    # screen positions and facing
+    vp = np.array(view_proj, np.float32)
+    by_mesh = {}
+    for item in queue.items:
+        by_mesh.setdefault(id(item.mesh), []).append(item)
+    with span(ctx.tracer, "transform", args={"items": len(queue)}):
+        _transform_items(vp, by_mesh, ctx.resolution)
+    if ctx.lighting is not None:
+        with span(ctx.tracer, "lighting"):
+            _light_items(ctx.lighting, by_mesh)
+
+    # every front facing triangle of the frame, in draw order
+    with span(ctx.tracer, "assemble"):
+        items = [item for _, batch in queue.batches() for item in batch]
+        tris = TriangleBuffer.from_items(items)
+    return view_proj, tris
+
+
+def _light_items(lighting, by_mesh):
+    for items in by_mesh.values():
+        models = model_matrices([item.inst for item in items])
+        lit = lighting.light_mesh(items[0].mesh, models)
+        for item, item_shade in zip(items, lit):
+            item.shade = item_shade
+
+
+def _transform_items(vp, by_mesh, resolution):
+    for items in by_mesh.values():
+        mesh = items[0].mesh
+        mvp = vp @ model_matrices([item.inst for item in items])
+        clip = (mesh.vert_array @ mvp.transpose(0, 2, 1))[..., :3]
+        tris = mesh.tri_array
+        # only the z of the clip space face normals decides facing
+        e1 = clip[:, tris[:, 1], :2] - clip[:, tris[:, 0], :2]
+        e2 = clip[:, tris[:, 2], :2] - clip[:, tris[:, 0], :2]
+        front = e1[..., 0] * e2[..., 1] - e1[..., 1] * e2[..., 0] < 0
+        screen = screen_vertices(clip, resolution)
+        for item, item_screen, item_front in zip(items, screen, front):
+            item.screen = item_screen
+            item.front = item_front
+
+
+def draw_frame(ctx, fb, frame):
+    view_proj, tris = frame
+
+    # front to back, so anything hidden by what is already drawn can be skipped
+    occluded = depth_occlusion_test(fb.depth, view_proj, ctx.resolution)
+    tracer = ctx.tracer
+    starts = tris.item_start.tolist()
+    for k, item in enumerate(tris.items):
+        if occluded(*item.bounds):
+            continue
+        first = starts[k]
+        last = starts[k + 1]
+        with span(tracer, "raster", args={"tris": last - first}):
+            draw_triangles(ctx, fb, tris, first, last)
+    if fb.samples > 1:
+        with span(tracer, "resolve"):
+            fb.resolve()
@@ -0,0 +1,50 @@
+class DrawItem:
+    __slots__ = (
+        "inst",
+        "mesh",
+        "texture",
+        "depth",
+        "bounds",
+        "screen",
+        "front",
+        "shade",
+    )
+
+    def __init__(self, inst, mesh, texture, depth):
+        self.inst = inst
+        self.mesh = mesh
+        self.texture = texture
+        self.depth = depth
+        self.bounds = inst.bounds
+        # filled in by the vertex stage
+        self.screen = None  # per triangle corner screen x, y and depth
+        self.front = None  # mask of the triangles facing the camera
+        self.shade = None  # per triangle corner rgb, only with lighting
+
+
+class RenderQueue:
+    """Collects opaque draws for a frame and hands them back batched by texture.
+
+    Inside a batch items run front to back, and batches run in order of their
+    nearest item, so the depth test rejects hidden pixels as early as possible
+    while each texture is only switched to once.
+    """
+
+    def __init__(self):
+        self.items = []
+
+    def submit(self, inst, mesh, texture, depth):
+        self.items.append(DrawItem(inst, mesh, texture, depth))
+
+    def clear(self):
+        self.items.clear()
+
+    def batches(self):
+        groups = {}
+        for item in sorted(self.items, key=lambda item: item.depth):
+            groups.setdefault(id(item.texture), []).append(item)
+        # dicts keep insertion order, so groups are already ordered by their nearest item
+        return [(items[0].texture, items) for items in groups.values()]
+
+    def __len__(self):
+        return len(self.items)
@@ -0,0 +1,289 @@
+import itertools
+
+import glm
+import numpy as np
+
+from .mesh import box_corners, calc_bounds
+
+OUTSIDE = 0
+INTERSECT = 1
+INSIDE = 2
+
+# shared by all scenes, so no two scenes or states of one scene share a version
+_versions = itertools.count(1)
+
+
+def model_matrix(pos, rot, scale):
+    model = glm.mat4(1)
+    model = glm.translate(model, pos)
+    model = glm.scale(model, scale)
+    model = glm.rotate(model, rot, glm.vec3(0, 1, 0))
+    return model
+
+
+def model_matrices(instances):
+    # model_matrix for many instances at once, as a (n, 4, 4) float32 array
+    pos = np.array([inst.pos.to_tuple() for inst in instances], np.float32)
+    scale = np.array([inst.scale.to_tuple() for inst in instances], np.float32)
+    rot = np.array([inst.rot for inst in instances], np.float32)
+    c = np.cos(rot)
+    s = np.sin(rot)
+
+    m = np.zeros((len(instances), 4, 4), np.float32)
+    m[:, 0, 0] = scale[:, 0] * c
+    m[:, 0, 2] = scale[:, 0] * s
+    m[:, 1, 1] = scale[:, 1]
+    m[:, 2, 0] = -scale[:, 2] * s
+    m[:, 2, 2] = scale[:, 2] * c
+    m[:, :3, 3] = pos
+    m[:, 3, 3] = 1
+    return m
+
+
+class Instance:
+    def __init__(
+        self, mesh, pos, rot=0.0, scale=glm.vec3(1), texture=None, bounds=None
+    ):
+        self.mesh = mesh
+        self.texture = texture  # None uses the default texture passed to draw()
+        self.pos = glm.vec3(pos)
+        self.rot = rot
+        self.scale = glm.vec3(scale)
+        # precomputed world bounds may be passed in, see world.make_instances
+        self.bounds = bounds or self.world_bounds()
+        self.leaf = -1  # bvh leaf holding this instance, set by Scene.build
+
+    def model_matrix(self):
+        return model_matrix(self.pos, self.rot, self.scale)
+
+    def world_bounds(self):
+        model = self.model_matrix()
+        corners = [
+            glm.vec3(model * glm.vec4(c, 1.0)) for c in box_corners(*self.mesh.bounds)
+        ]
+        return calc_bounds(corners)
+
+
+def frustum_planes(view_proj):
+    # Gribb/Hartmann plane extraction, planes point inwards
+    rows = [glm.row(view_proj, i) for i in range(4)]
+    planes = [
+        rows[3] + rows[0],  # left
+        rows[3] - rows[0],  # right
+        rows[3] + rows[1],  # bottom
+        rows[3] - rows[1],  # top
+        rows[3] + rows[2],  # near
+        rows[3] - rows[2],  # far
+    ]
+    return [p / glm.length(glm.vec3(p)) for p in planes]
+
+
+def classify_box(lo, hi, planes):
+    result = INSIDE
+    for p in planes:
+        # corners furthest along and against the plane normal
+        far = glm.vec3(
+            hi.x if p.x >= 0 else lo.x,
+            hi.y if p.y >= 0 else lo.y,
+            hi.z if p.z >= 0 else lo.z,
+        )
+        if glm.dot(glm.vec3(p), far) + p.w < 0:
+            return OUTSIDE
+        near = glm.vec3(
+            lo.x if p.x >= 0 else hi.x,
+            lo.y if p.y >= 0 else hi.y,
+            lo.z if p.z >= 0 else hi.z,
+        )
+        if glm.dot(glm.vec3(p), near) + p.w < 0:
+            result = INTERSECT
+    return result
+
+
+def depth_occlusion_test(z_buffer, view_proj, resolution):
+    # z_buffer is a (height, width) array like Framebuffer.depth
+    # a box is occluded when every depth it covers on screen is already nearer
+    # than the nearest point of the box
+    width = int(resolution.x)
+    height = int(resolution.y)
+
+    def occluded(lo, hi):
+        xs = []
+        ys = []
+        nearest = float("inf")
+        for corner in box_corners(lo, hi):
+            v = view_proj * glm.vec4(corner, 1.0)
+            if v.z <= 0:
+                return False  # box reaches behind the camera
+            xs.append(resolution.x * (v.x / v.z + 1) / 2)
+            ys.append(resolution.y * (1 - (v.y / v.z + 1) / 2))
+            nearest = min(nearest, v.z)
+
+        x0 = max(int(min(xs)), 0)
+        x1 = min(int(max(xs)), width - 1)
+        y0 = max(int(min(ys)), 0)
+        y1 = min(int(max(ys)), height - 1)
+        if x0 > x1 or y0 > y1:
+            return False
+        return z_buffer[y0 : y1 + 1, x0 : x1 + 1].max() < nearest
+
+    return occluded
+
+
+class Scene:
+    """Instances stored in a bounding volume hierarchy.
+
+    Adding or removing instances marks the tree for a rebuild on the next
+    query, moving one only refits the boxes on the path to the root.
+    """
+
+    def __init__(self, leaf_size=4):
+        self.leaf_size = leaf_size
+        self.instances = []
+        self.dirty = False
+        # bumped on every change, lets callers reuse results for an unchanged scene
+        self.version = next(_versions)
+        self._clear_nodes()
+
+    def _clear_nodes(self):
+        self.node_lo = []
+        self.node_hi = []
+        self.node_parent = []
+        self.node_children = []  # (left, right), None for leaves
+        self.node_items = []  # instances, only filled for leaves
+
+    def add(self, instance):
+        self.instances.append(instance)
+        self.dirty = True
+        self.version = next(_versions)
+        return instance
+
+    def remove(self, instance):
+        self.instances.remove(instance)
+        instance.leaf = -1
+        self.dirty = True
+        self.version = next(_versions)
+
+    def add_many(self, instances):
+        self.instances.extend(instances)
+        self.dirty = True
+        self.version = next(_versions)
+
+    def remove_many(self, instances):
+        # one pass over the scene instead of a list.remove per instance
+        gone = {id(inst) for inst in instances}
+        self.instances = [inst for inst in self.instances if id(inst) not in gone]
+        for inst in instances:
+            inst.leaf = -1
+        self.dirty = True
+        self.version = next(_versions)
+
+    def build(self):
+        version = self.version
+        self._clear_nodes()
+        if self.instances:
+            self._build_node(list(self.instances), -1)
+        # a change that raced the build gets picked up by the next query
+        self.dirty = self.version != version
+
+    def _build_node(self, items, parent):
+        index = len(self.node_lo)
+        lo, hi = merge_bounds(inst.bounds for inst in items)
+        self.node_lo.append(lo)
+        self.node_hi.append(hi)
+        self.node_parent.append(parent)
+        self.node_children.append(None)
+        self.node_items.append(None)
+
+        if len(items) <= self.leaf_size:
+            self.node_items[index] = items
+            for inst in items:
+                inst.leaf = index
+            return index
+
+        # median split along the longest axis of the centroids
+        centers = [(inst.bounds[0] + inst.bounds[1]) * 0.5 for inst in items]
+        c_lo, c_hi = calc_bounds(centers)
+        extent = c_hi - c_lo
+        axis = 0
+        if extent.y > extent[axis]:
+            axis = 1
+        if extent.z > extent[axis]:
+            axis = 2
+        order = sorted(range(len(items)), key=lambda i: centers[i][axis])
+        items = [items[i] for i in order]
+        mid = len(items) // 2
+
+        left = self._build_node(items[:mid], index)
+        right = self._build_node(items[mid:], index)
+        self.node_children[index] = (left, right)
+        return index
+
+    def move(self, instance, pos=None, rot=None, scale=None):
+        if pos is not None:
+            instance.pos = glm.vec3(pos)
+        if rot is not None:
+            instance.rot = rot
+        if scale is not None:
+            instance.scale = glm.vec3(scale)
+        self.refit(instance)
+
+    def refit(self, instance):
+        instance.bounds = instance.world_bounds()
+        self.version = next(_versions)
+        if self.dirty:
+            return  # the rebuild picks up the new bounds
+
+        node = instance.leaf
+        while node != -1:
+            children = self.node_children[node]
+            if children is None:
+                lo, hi = merge_bounds(inst.bounds for inst in self.node_items[node])
+            else:
+                lo, hi = merge_bounds(
+                    (self.node_lo[c], self.node_hi[c]) for c in children
+                )
+            if lo == self.node_lo[node] and hi == self.node_hi[node]:
+                break  # ancestors are unaffected
+            self.node_lo[node] = lo
+            self.node_hi[node] = hi
+            node = self.node_parent[node]
+
+    def query_frustum(self, planes):
+        if self.dirty:
+            self.build()
+
+        visible = []
+        if not self.node_lo:
+            return visible
+
+        stack = [(0, INTERSECT)]
+        while stack:
+            node, state = stack.pop()
+            if state != INSIDE:
+                # once a node is fully inside, its subtree needs no plane tests
+                state = classify_box(self.node_lo[node], self.node_hi[node], planes)
+                if state == OUTSIDE:
+                    continue
+
+            children = self.node_children[node]
+            if children is not None:
+                stack.append((children[1], state))
+                stack.append((children[0], state))
+                continue
+            for inst in self.node_items[node]:
+                if state == INSIDE or classify_box(*inst.bounds, planes) != OUTSIDE:
+                    visible.append(inst)
+        return visible
+
+
+def merge_bounds(bounds):
+    lo = None
+    hi = None
+    for b_lo, b_hi in bounds:
+        if lo is None:
+            lo = glm.vec3(b_lo)
+            hi = glm.vec3(b_hi)
+        else:
+            lo = glm.min(lo, b_lo)
+            hi = glm.max(hi, b_hi)
+    return lo, hi
@@ -0,0 +1,146 @@
+import sys
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+MAGIC = 0x53524652  # "SRFR"
+HEADER_WORDS = 8  # magic, width, height, slots, has_depth, latest seq, unused...
+LATEST = 5
+
+
+def _layout(width, height, slots, has_depth):
+    # byte offsets of the slot sequence numbers, color slots and depth slots
+    seqs = HEADER_WORDS * 8
+    color = seqs + slots * 8
+    depth = color + slots * width * height * 4
+    end = depth + (slots * width * height * 4 if has_depth else 0)
+    return seqs, color, depth, end
+
+
+def _attach(name):
+    # readers must not unlink the publisher's segment when they exit
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    shm = shared_memory.SharedMemory(name=name)
+    resource_tracker.unregister(shm._name, "shared_memory")
+    return shm
+
+
+class _Ring:
+    def _map(self, shm, width, height, slots, has_depth):
+        self.shm = shm
+        self.width = width
+        self.height = height
+        self.slots = slots
+        self.has_depth = has_depth
+        seqs, color, depth, _ = _layout(width, height, slots, has_depth)
+        buf = shm.buf
+        self.header = np.ndarray(HEADER_WORDS, np.uint64, buf)
+        self.slot_seq = np.ndarray(slots, np.uint64, buf, seqs)
+        self.color = np.ndarray((slots, height, width), np.uint32, buf, color)
+        self.depth = None
+        if has_depth:
+            self.depth = np.ndarray((slots, height, width), np.float32, buf, depth)
+
+    def _unmap(self):
+        # numpy views keep the buffer exported, drop them before closing
+        self.header = self.slot_seq = self.color = self.depth = None
+        self.shm.close()
+
+
+class FramePublisher(_Ring):
+    """Writes finished frames into a ring of shared memory slots.
+
+    publish() never waits for readers, it overwrites the oldest slot and
+    bumps the frame sequence number (starting at 1).
+    """
+
+    def __init__(self, name, width, height, slots=3, depth=False):
+        size = _layout(width, height, slots, depth)[3]
+        shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        self._map(shm, width, height, slots, depth)
+        self.header[:] = 0
+        self.header[:5] = (MAGIC, width, height, slots, int(depth))
+        self.slot_seq[:] = 0
+        self.seq = 0
+
+    def publish(self, color, depth=None):
+        self.seq += 1
+        slot = self.seq % self.slots
+        # 0 marks the slot as being written, readers holding it see it as stale
+        self.slot_seq[slot] = 0
+        self.color[slot] = color
+        if self.has_depth and depth is not None:
+            self.depth[slot] = depth
+        self.slot_seq[slot] = self.seq
+        self.header[LATEST] = self.seq
+        return self.seq
+
+    def close(self, unlink=True):
+        self._unmap()
+        if unlink:
+            self.shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class SharedFrame:
+    __slots__ = ("seq", "slot", "color", "depth")
+
+    def __init__(self, seq, slot, color, depth):
+        self.seq = seq
+        self.slot = slot
+        self.color = color
+        self.depth = depth
+
+
+class FrameReader(_Ring):
+    """Attaches to a FramePublisher's ring by name.
+
+    latest() returns views straight into shared memory, no copy is made. The
+    publisher may reuse that slot once it has moved `slots` frames ahead, so
+    check valid(frame) after using the data (or copy it) to know it was not
+    overwritten meanwhile.
+    """
+
+    def __init__(self, name):
+        shm = _attach(name)
+        magic, width, height, slots, has_depth = (
+            int(v) for v in np.ndarray(5, np.uint64, shm.buf)
+        )
+        if magic != MAGIC:
+            shm.close()
+            raise ValueError(f"{name!r} is not a frame ring")
+        self._map(shm, width, height, slots, bool(has_depth))
+
+    def latest(self):
+        for _ in range(self.slots):
+            seq = int(self.header[LATEST])
+            if seq == 0:
+                return None  # nothing published yet
+            slot = seq % self.slots
+            frame = SharedFrame(
+                seq,
+                slot,
+                self.color[slot],
+                self.depth[slot] if self.has_depth else None,
+            )
+            if self.valid(frame):
+                return frame
+        return None
+
+    def valid(self, frame):
+        return int(self.slot_seq[frame.slot]) == frame.seq
+
+    def close(self):
+        self._unmap()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,235 @@
+import numpy as np
+
+LINEAR = "linear"
+MORTON = "morton"  # z-order curve
+TILED = "tiled"  # 4x4 blocks, row-major inside each block
+LAYOUTS = (LINEAR, MORTON, TILED)
+
+TILE = 4
+
+NEAREST = "nearest"
+BILINEAR = "bilinear"
+FILTERS = (NEAREST, BILINEAR)
+
+WRAP = "wrap"  # repeat the texture outside 0..1
+CLAMP = "clamp"  # stretch the edge texels
+ADDRESS_MODES = (WRAP, CLAMP)
+
+
+def pack_rgb(rgb):
+    # (..., 3) uint8 -> 0xRRGGBB uint32, the pixel format of a default 32 bit Surface
+    rgb = rgb.astype(np.uint32)
+    return (rgb[..., 0] << 16) | (rgb[..., 1] << 8) | rgb[..., 2]
+
+
+def unpack_rgb(packed):
+    # inverse of pack_rgb
+    packed = np.asarray(packed, np.uint32)
+    return np.stack(
+        ((packed >> 16) & 0xFF, (packed >> 8) & 0xFF, packed & 0xFF), axis=-1
+    ).astype(np.uint8)
+
+
+def part1by1(n):
+    # spread the low 16 bits of n out to the even bits, works on ints and arrays
+    n = n & 0x0000FFFF
+    n = (n | (n << 8)) & 0x00FF00FF
+    n = (n | (n << 4)) & 0x0F0F0F0F
+    n = (n | (n << 2)) & 0x33333333
+    n = (n | (n << 1)) & 0x55555555
+    return n
+
+
+def morton_index(x, y):
+    return part1by1(x) | (part1by1(y) << 1)
+
+
+def next_pow2(n):
+    return 1 << (int(n) - 1).bit_length()
+
+
+def downsample(texels):
+    # one mip level down, a 2x2 box filter (odd edges drop their last texel)
+    w = max(texels.shape[0] // 2, 1)
+    h = max(texels.shape[1] // 2, 1)
+    rgb = unpack_rgb(texels[: w * 2, : h * 2]).astype(np.uint16)
+    if texels.shape[0] > 1:
+        rgb = rgb[0::2] + rgb[1::2]
+    else:
+        rgb = rgb * 2
+    if texels.shape[1] > 1:
+        rgb = rgb[:, 0::2] + rgb[:, 1::2]
+    else:
+        rgb = rgb * 2
+    return pack_rgb((rgb + 2) // 4)
+
+
+def mip_chain(texels):
+    # the texels and every smaller level down to 1x1
+    levels = [texels]
+    while max(levels[-1].shape) > 1:
+        levels.append(downsample(levels[-1]))
+    return levels
+
+
+def lerp_packed(a, b, w):
+    # blend packed 0xRRGGBB arrays by w / 256 (w in 0..256), red and blue share
+    # one multiply, their products cannot overlap in 32 bits
+    iw = 256 - w
+    rb = ((a & 0xFF00FF) * iw + (b & 0xFF00FF) * w + 0x800080) >> 8
+    g = ((a & 0x00FF00) * iw + (b & 0x00FF00) * w + 0x008000) >> 8
+    return (rb & 0xFF00FF) | (g & 0x00FF00)
+
+
+def _wrap(coords, size):
+    # a mask for power of two sizes, right for negative coords too
+    if size & (size - 1) == 0:
+        return coords & (size - 1)
+    return np.mod(coords, size)
+
+
+def _address(coords, size, mode):
+    if mode == WRAP:
+        return _wrap(coords, size)
+    return np.clip(coords, 0, size - 1)
+
+
+def _padded_offsets(offsets, mode):
+    # offsets of texels -1 .. size under an address mode, texel i at index i + 1
+    size = len(offsets)
+    return offsets[_address(np.arange(-1, size + 1), size, mode)]
+
+
+class Texture:
+    """Packed texels stored in one of LAYOUTS.
+
+    Texels are addressed as (x, y) like a pygame Surface. Morton storage pads
+    the texture to a power of two square, tiled storage pads each side to a
+    multiple of TILE.
+    """
+
+    def __init__(self, texels, layout=LINEAR):
+        if layout not in LAYOUTS:
+            raise ValueError(f"unknown texture layout {layout!r}")
+        self.width, self.height = texels.shape
+        self.layout = layout
+
+        if layout == LINEAR:
+            self.stride = self.width
+            size = self.width * self.height
+        elif layout == MORTON:
+            self.stride = next_pow2(max(self.width, self.height))
+            size = self.stride * self.stride
+        else:
+            self.stride = -(-self.width // TILE)  # tiles per row
+            size = self.stride * -(-self.height // TILE) * TILE * TILE
+
+        # every layout splits into independent x and y offsets (morton bits do
+        # not overlap), so addressing is two table lookups and an add
+        xs = np.arange(self.width, dtype=np.int64)
+        ys = np.arange(self.height, dtype=np.int64)
+        self.x_offset = self.layout_address(xs, 0)
+        self.y_offset = self.layout_address(0, ys)
+        # with the address mode baked in, so bilinear taps need no wrap or
+        # clamp of their own
+        self.padded_offsets = {
+            mode: (
+                _padded_offsets(self.x_offset, mode),
+                _padded_offsets(self.y_offset, mode),
+            )
+            for mode in ADDRESS_MODES
+        }
+
+        self.data = np.zeros(size, dtype=np.uint32)
+        self.data[self.address(*np.indices(texels.shape))] = texels
+
+    @classmethod
+    def from_surface(cls, surface, layout=LINEAR):
+        import pygame
+
+        return cls(pack_rgb(pygame.surfarray.array3d(surface)), layout)
+
+    @classmethod
+    def load(cls, path, layout=LINEAR):
+        import pygame
+
+        return cls.from_surface(pygame.image.load(path), layout)
+
+    @property
+    def nbytes(self):
+        padded = sum(x.nbytes + y.nbytes for x, y in self.padded_offsets.values())
+        return self.data.nbytes + self.x_offset.nbytes + self.y_offset.nbytes + padded
+
+    def get_width(self):
+        return self.width
+
+    def get_height(self):
+        return self.height
+
+    def layout_address(self, x, y):
+        if self.layout == LINEAR:
+            return y * self.stride + x
+        if self.layout == MORTON:
+            return morton_index(x, y)
+        tile = (y // TILE) * self.stride + x // TILE
+        return tile * (TILE * TILE) + (y % TILE) * TILE + x % TILE
+
+    def address(self, x, y):
+        # x and y may be ints or matching integer arrays
+        return self.x_offset[x] + self.y_offset[y]
+
+    def fetch(self, x, y):
+        return self.data[self.address(x, y)]
+
+    def sample(self, u, v, address=WRAP):
+        # nearest texel for arrays of uvs, same mapping as main.sample_texture
+        if address == WRAP:
+            u = np.mod(u, 1)
+            v = np.mod(v, 1)
+        tex_y = np.clip((u * self.height).astype(np.int64), 0, self.height - 1)
+        tex_x = np.clip((v * self.width).astype(np.int64), 0, self.width - 1)
+        return self.fetch(tex_x, tex_y)
+
+    def sample_bilinear(self, u, v, address=WRAP, integer=True):
+        # bilinear filtering for arrays of uvs, u runs along y like in sample().
+        # the weights are computed once per batch, then four gathers and three
+        # blends, either in 8 bit fixed point on the packed texels or in float32
+        fx = np.asarray(v, np.float32) * self.width - 0.5
+        fy = np.asarray(u, np.float32) * self.height - 0.5
+        if address == CLAMP:
+            # past an edge both taps land on the edge texel whatever the
+            # weight, so clamping the coordinate is the same as clamping taps
+            fx = np.clip(fx, -1, self.width - 1)
+            fy = np.clip(fy, -1, self.height - 1)
+        x0 = np.floor(fx)
+        y0 = np.floor(fy)
+        wx = fx - x0
+        wy = fy - y0
+        x0 = x0.astype(np.int64)
+        y0 = y0.astype(np.int64)
+        if address == WRAP:
+            x0 = _wrap(x0, self.width)
+            y0 = _wrap(y0, self.height)
+
+        # x0 and y0 are now in -1 .. size - 1, the padded tables hold both taps
+        x_offsets, y_offsets = self.padded_offsets[address]
+        x0 += 1
+        y0 += 1
+        ox0 = x_offsets[x0]
+        ox1 = x_offsets[x0 + 1]
+        oy0 = y_offsets[y0]
+        oy1 = y_offsets[y0 + 1]
+        c00 = self.data[ox0 + oy0]
+        c10 = self.data[ox1 + oy0]
+        c01 = self.data[ox0 + oy1]
+        c11 = self.data[ox1 + oy1]
+        if integer:
+            wx = (wx * 256 + 0.5).astype(np.uint32)
+            wy = (wy * 256 + 0.5).astype(np.uint32)
+            return lerp_packed(lerp_packed(c00, c10, wx), lerp_packed(c01, c11, wx), wy)
+
+        wx = wx[..., None]
+        wy = wy[..., None]
+        top = unpack_rgb(c00) * (1 - wx) + unpack_rgb(c10) * wx
+        bottom = unpack_rgb(c01) * (1 - wx) + unpack_rgb(c11) * wx
+        return pack_rgb(top * (1 - wy) + bottom * wy + 0.5)
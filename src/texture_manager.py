@@ -0,0 +1,143 @@
+import math
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from .texture import LINEAR, Texture, mip_chain, pack_rgb
+
+
+class TextureHandle:
+    __slots__ = ("manager", "key")
+
+    def __init__(self, manager, key):
+        self.manager = manager
+        self.key = key
+
+    def get(self, pixels=None, wait=False):
+        return self.manager.get(self, pixels, wait)
+
+    def __repr__(self):
+        return f"TextureHandle({self.key!r})"
+
+
+class TextureStats:
+    __slots__ = ("hits", "misses", "loads", "evictions")
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.loads = 0
+        self.evictions = 0
+
+    def __repr__(self):
+        return (
+            f"TextureStats(hits={self.hits}, misses={self.misses},"
+            f" loads={self.loads}, evictions={self.evictions})"
+        )
+
+
+def _decode(path, layout, mips):
+    # runs on a decode thread, the image file is only opened here
+    import pygame
+
+    texels = pack_rgb(pygame.surfarray.array3d(pygame.image.load(path)))
+    levels = mip_chain(texels) if mips else [texels]
+    return [Texture(level, layout) for level in levels]
+
+
+class TextureManager:
+    """Hands out texture handles and keeps decoded textures under a byte budget.
+
+    register() only records the path. The image is decoded on a background
+    thread the first time get() asks for it, until then get() returns None
+    (or blocks with wait=True) and the caller draws with a fallback. Decoded
+    textures, mip chain included, sit in an LRU cache and the least recently
+    used ones are dropped once their bytes exceed budget, to be decoded again
+    if they come back into view.
+    """
+
+    def __init__(self, budget=64 << 20, layout=LINEAR, mips=True, workers=1):
+        self.budget = budget
+        self.layout = layout
+        self.mips = mips
+        self.handles = {}
+        self.cache = OrderedDict()  # key -> list of mip levels, base first
+        self.sizes = {}
+        self.bytes = 0
+        self.pending = {}  # key -> decode future
+        self.stats = TextureStats()
+        # bumped when the set of decoded textures changes
+        self.version = 0
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(workers, thread_name_prefix="decode")
+
+    def register(self, path):
+        handle = self.handles.get(path)
+        if handle is None:
+            handle = self.handles[path] = TextureHandle(self, path)
+        return handle
+
+    def get(self, handle, pixels=None, wait=False):
+        # pixels: the on screen size the texture is drawn at, picks the mip
+        key = handle.key
+        with self.lock:
+            levels = self.cache.get(key)
+            if levels is not None:
+                self.cache.move_to_end(key)
+                self.stats.hits += 1
+                return _pick_level(levels, pixels)
+            self.stats.misses += 1
+            future = self.pending.get(key)
+            submitted = future is None
+            if submitted:
+                future = self.executor.submit(_decode, key, self.layout, self.mips)
+                self.pending[key] = future
+        if submitted:
+            # outside the lock, a finished future runs the callback right here
+            future.add_done_callback(lambda f: self._loaded(key, f))
+        if not wait:
+            return None
+        future.result()
+        with self.lock:
+            levels = self.cache.get(key)
+        if levels is None:
+            # evicted again right away, the budget is smaller than this texture
+            levels = future.result()
+        return _pick_level(levels, pixels)
+
+    def _loaded(self, key, future):
+        if future.exception() is not None:
+            with self.lock:
+                del self.pending[key]
+            return  # get(wait=True) re-raises, the next get() retries
+        levels = future.result()
+        size = sum(level.nbytes for level in levels)
+        with self.lock:
+            del self.pending[key]
+            self.cache[key] = levels
+            self.sizes[key] = size
+            self.bytes += size
+            self.stats.loads += 1
+            self.version += 1
+            while self.bytes > self.budget and len(self.cache) > 1:
+                old, _ = self.cache.popitem(last=False)
+                self.bytes -= self.sizes.pop(old)
+                self.stats.evictions += 1
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _pick_level(levels, pixels):
+    # the largest level that is no bigger than needed for pixels on screen
+    if pixels is None or len(levels) == 1:
+        return levels[0]
+    size = max(levels[0].width, levels[0].height)
+    level = int(math.log2(max(size / max(pixels, 1), 1)))
+    return levels[min(level, len(levels) - 1)]
@@ -0,0 +1,125 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+
+
+class _Span:
+    __slots__ = ("tracer", "name", "cat", "args", "start")
+
+    def __init__(self, tracer, name, cat, args):
+        self.tracer = tracer
+        self.name = name
+        self.cat = cat
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        end = time.perf_counter_ns()
+        self.tracer.record(self.name, self.cat, self.start, end - self.start, self.args)
+
+
+class _NoSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+_NO_SPAN = _NoSpan()
+
+
+def span(tracer, name, cat="render", args=None):
+    # `with span(ctx.tracer, "stage"):` costs next to nothing without a tracer.
+    # anything with a span() method will do, see alloc.AllocTracker
+    if tracer is None:
+        return _NO_SPAN
+    return tracer.span(name, cat, args)
+
+
+class Tracer:
+    """Records timed stage spans for the Chrome trace viewer or Perfetto.
+
+    Every span is stored as one complete ("X") event with the process and
+    thread it ran on, so a truncated trace never holds unmatched begin/end
+    pairs. With a capacity the events live in a ring buffer and only the
+    most recent ones are kept, which bounds memory on long runs. dump() writes
+    Chrome Trace Event JSON.
+    """
+
+    def __init__(self, capacity=None):
+        self.events = deque(maxlen=capacity)
+        self.recorded = 0
+        self.pid = os.getpid()
+        self.threads = {}
+
+    def span(self, name, cat="render", args=None):
+        return _Span(self, name, cat, args)
+
+    def _event(self, name, cat, ph, start_ns, args):
+        tid = threading.get_native_id()
+        if tid not in self.threads:
+            self.threads[tid] = threading.current_thread().name
+        event = {
+            "name": name,
+            "cat": cat,
+            "ph": ph,
+            "ts": start_ns / 1000,  # microseconds
+            "pid": self.pid,
+            "tid": tid,
+        }
+        if args:
+            event["args"] = args
+        return event
+
+    def record(self, name, cat, start_ns, dur_ns, args=None):
+        event = self._event(name, cat, "X", start_ns, args)
+        event["dur"] = dur_ns / 1000
+        self.events.append(event)
+        self.recorded += 1
+
+    def instant(self, name, cat="render", args=None):
+        event = self._event(name, cat, "i", time.perf_counter_ns(), args)
+        event["s"] = "t"  # scoped to the thread
+        self.events.append(event)
+        self.recorded += 1
+
+    @property
+    def dropped(self):
+        return self.recorded - len(self.events)
+
+    def clear(self):
+        self.events.clear()
+        self.recorded = 0
+
+    def trace_events(self):
+        # thread names first, so the viewer labels the tracks
+        meta = [
+            {
+                "name": "thread_name",
+                "ph": "M",
+                "pid": self.pid,
+                "tid": tid,
+                "args": {"name": name},
+            }
+            for tid, name in list(self.threads.items())
+        ]
+        return meta + list(self.events)
+
+    def dump(self, path):
+        with open(path, "w") as f:
+            json.dump(
+                {
+                    "traceEvents": self.trace_events(),
+                    "displayTimeUnit": "ms",
+                    "otherData": {"dropped": self.dropped},
+                },
+                f,
+            )
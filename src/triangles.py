@@ -0,0 +1,126 @@
+import glm
+import numpy as np
+
+
+def screen_vertices(clip, resolution):
+    # (..., V, 3) clip xyz -> (..., V, 3) screen x, y and depth. the divide
+    # runs in float64 like the scalar code it replaced did, so the float32
+    # results are the same to the bit
+    screen = np.empty(clip.shape, np.float32)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ndc = clip[..., :2] / clip[..., 2:].astype(np.float64)
+    screen[..., 0] = resolution[0] * (ndc[..., 0] + 1) / 2
+    screen[..., 1] = resolution[1] * (1 - (ndc[..., 1] + 1) / 2)
+    screen[..., 2] = clip[..., 2]
+    return screen
+
+
+class TriangleBuffer:
+    """Every triangle of a frame in flat float32 arrays, one row per triangle.
+
+    Columns are the three corners in mesh order. x and y are screen
+    coordinates, z the depth (clip z, which also serves as w here) and inv_w
+    its reciprocal, 0 behind the camera. u and v are the texture
+    coordinates, material indexes `materials` (the textures) and shade holds
+    optional rgb multipliers per corner. The triangles of items[k] are rows
+    item_start[k]:item_start[k + 1], items are in the order they are drawn.
+    """
+
+    def __init__(
+        self, x, y, z, u, v, material, materials, items, item_start, shade=None
+    ):
+        self.x = x
+        self.y = y
+        self.z = z
+        self.inv_w = np.zeros_like(z)
+        np.divide(1, z, out=self.inv_w, where=z > 0)
+        self.u = u
+        self.v = v
+        self.material = material
+        self.materials = materials
+        self.shade = shade
+        self.items = items
+        self.item_start = item_start
+        self._setup = None
+
+    @classmethod
+    def from_items(cls, items):
+        # items carry the per vertex screen positions and the front facing
+        # mask of the vertex stage, back faces are dropped here. everything is
+        # written straight into the frame's arrays, no per item copies
+        item_start = np.zeros(len(items) + 1, np.int64)
+        np.cumsum([np.count_nonzero(item.front) for item in items], out=item_start[1:])
+        count = int(item_start[-1])
+        xyz = np.empty((3, count, 3), np.float32)
+        uv = np.empty((2, count, 3), np.float32)
+        material = np.empty(count, np.int32)
+        # lighting is on for the whole frame or not at all
+        lit = bool(items) and items[0].shade is not None
+        shade = np.empty((count, 3, 3), np.float32) if lit else None
+
+        materials = []
+        material_ids = {}
+        starts = item_start.tolist()
+        for item, first, last in zip(items, starts, starts[1:]):
+            front = item.front
+            corners = item.screen[item.mesh.tri_array[front]]
+            xyz[:, first:last] = corners.transpose(2, 0, 1)
+            uv[:, first:last] = item.mesh.uv_array[front].transpose(2, 0, 1)
+            key = id(item.texture)
+            if key not in material_ids:
+                material_ids[key] = len(materials)
+                materials.append(item.texture)
+            material[first:last] = material_ids[key]
+            if lit:
+                shade[first:last] = item.shade[front]
+        return cls(*xyz, *uv, material, materials, items, item_start, shade)
+
+    def __len__(self):
+        return len(self.x)
+
+    def setup(self):
+        # barycentric() of every triangle at once, as planes: the weights at
+        # pixel (px, py) are origin + dx * px + dy * py
+        if self._setup is None:
+            x = self.x.astype(np.float64)
+            y = self.y.astype(np.float64)
+            ax = x[:, 0]
+            ay = y[:, 0]
+            v0x = x[:, 2] - ax
+            v0y = y[:, 2] - ay
+            v1x = x[:, 1] - ax
+            v1y = y[:, 1] - ay
+            d00 = v0x * v0x + v0y * v0y
+            d01 = v0x * v1x + v0y * v1y
+            d11 = v1x * v1x + v1y * v1y
+            denom = d00 * d11 - d01 * d01 + 0.0001
+            ux = (d11 * v0x - d01 * v1x) / denom
+            uy = (d11 * v0y - d01 * v1y) / denom
+            vx = (d00 * v1x - d01 * v0x) / denom
+            vy = (d00 * v1y - d01 * v0y) / denom
+            u0 = -(ux * ax + uy * ay)
+            v0 = -(vx * ax + vy * ay)
+            self._setup = (
+                np.stack((u0, v0, 1 - u0 - v0), axis=1),
+                np.stack((ux, vx, -ux - vx), axis=1),
+                np.stack((uy, vy, -uy - vy), axis=1),
+            )
+        return self._setup
+
+    def texture(self, i):
+        return self.materials[self.material[i]]
+
+    def verts(self, i):
+        # glm corners for the scalar rasterizers
+        return [
+            glm.vec3(x, y, z)
+            for x, y, z in zip(
+                self.x[i].tolist(), self.y[i].tolist(), self.z[i].tolist()
+            )
+        ]
+
+    def tex_coords(self, i):
+        return tuple(zip(self.u[i].tolist(), self.v[i].tolist()))
+
+    def corner_shade(self, i):
+        return None if self.shade is None else self.shade[i].tolist()
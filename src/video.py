@@ -0,0 +1,102 @@
+import queue
+import sys
+import threading
+
+import numpy as np
+
+from .texture import unpack_rgb
+
+Y4M = "y4m"
+RAW_RGB = "rgb"
+
+_CLOSE = object()
+
+
+def rgb_to_yuv444(rgb):
+    # bt.601 limited range, the default players assume for y4m
+    r, g, b = (rgb[..., i].astype(np.int32) for i in range(3))
+    y = ((66 * r + 129 * g + 25 * b + 128) >> 8) + 16
+    u = ((-38 * r - 74 * g + 112 * b + 128) >> 8) + 128
+    v = ((112 * r - 94 * g - 18 * b + 128) >> 8) + 128
+    return np.stack((y, u, v)).astype(np.uint8)
+
+
+def encode_frame(frame, fmt):
+    rgb = unpack_rgb(frame)
+    if fmt == RAW_RGB:
+        return rgb.tobytes()
+    return b"FRAME\n" + rgb_to_yuv444(rgb).tobytes()
+
+
+class VideoSink:
+    """Streams packed (height, width) frames as y4m or raw rgb24.
+
+    Encoding and writing run on a background thread fed by a bounded queue,
+    so write() only blocks when the writer falls queue_size frames behind.
+    path "-" writes to stdout, e.g. `python -m src.batch --video - | ffplay -`.
+    Raw rgb24 has no header, readers need `-f rawvideo -pix_fmt rgb24 -s WxH`.
+    """
+
+    def __init__(self, path, width, height, fmt=Y4M, fps=30, queue_size=8):
+        if fmt not in (Y4M, RAW_RGB):
+            raise ValueError(f"unknown video format {fmt!r}")
+        self.width = width
+        self.height = height
+        self.fmt = fmt
+        self.fps = fps
+        if path == "-":
+            self.stream = sys.stdout.buffer
+            self.owns_stream = False
+        else:
+            self.stream = open(path, "wb")
+            self.owns_stream = True
+        self.frames = queue.Queue(queue_size)
+        self.error = None
+        self.thread = threading.Thread(
+            target=self._run, name="video-writer", daemon=True
+        )
+        self.thread.start()
+
+    def _run(self):
+        try:
+            if self.fmt == Y4M:
+                header = f"YUV4MPEG2 W{self.width} H{self.height} F{self.fps}:1"
+                self.stream.write(header.encode("ascii") + b" Ip A1:1 C444\n")
+            while True:
+                frame = self.frames.get()
+                if frame is _CLOSE:
+                    break
+                self.stream.write(encode_frame(frame, self.fmt))
+            self.stream.flush()
+        except Exception as e:  # e.g. BrokenPipeError when the reader goes away
+            self.error = e
+            # keep draining so a blocked write() can notice the error
+            while self.frames.get() is not _CLOSE:
+                pass
+
+    def write(self, frame):
+        if self.error is not None:
+            raise self.error
+        if frame.shape != (self.height, self.width):
+            raise ValueError(
+                f"expected a {self.height}x{self.width} frame, got {frame.shape}"
+            )
+        # the caller usually reuses its buffer, so queue a copy
+        self.frames.put(np.array(frame, np.uint32))
+
+    def close(self):
+        if self.thread is None:
+            return
+        self.frames.put(_CLOSE)
+        self.thread.join()
+        self.thread = None
+        if self.owns_stream:
+            self.stream.close()
+        if self.error is not None:
+            raise self.error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
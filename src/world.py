@@ -0,0 +1,303 @@
+import argparse
+import mmap
+import queue
+import threading
+from collections import OrderedDict
+
+import glm
+import numpy as np
+
+from .mesh import cube_mesh
+from .scene import Instance
+
+MAGIC = b"SRWD"
+VERSION = 1
+
+# magic, version, chunk size, mesh count, chunk count, offsets of the tables
+HEADER = np.dtype(
+    [
+        ("magic", "S4"),
+        ("version", "<u4"),
+        ("chunk_size", "<f4"),
+        ("mesh_count", "<u4"),
+        ("chunk_count", "<u4"),
+        ("names_offset", "<u8"),
+        ("chunks_offset", "<u8"),
+        ("instances_offset", "<u8"),
+    ]
+)
+CHUNK = np.dtype(
+    [
+        ("cell", "<i4", 2),  # x and z grid cell
+        ("lo", "<f4", 3),
+        ("hi", "<f4", 3),
+        ("first", "<u8"),  # index of the chunk's first instance
+        ("count", "<u4"),
+    ]
+)
+INSTANCE = np.dtype(
+    [
+        ("pos", "<f4", 3),
+        ("rot", "<f4"),
+        ("scale", "<f4", 3),
+        ("mesh", "<u4"),  # index into the mesh name table
+        ("lo", "<f4", 3),  # world bounds
+        ("hi", "<f4", 3),
+    ]
+)
+
+
+def _align(n, to=16):
+    return (n + to - 1) // to * to
+
+
+def write_world(path, instances, mesh_names, chunk_size=64.0):
+    """Write instances into a chunked world file.
+
+    instances is an INSTANCE structured array (see world_instances) and
+    mesh_names the names its mesh indices refer to. Instances are grouped into
+    square chunk_size cells on the xz plane and stored chunk by chunk, each
+    chunk with its bounds, so a reader can page in single regions.
+    """
+    instances = np.asarray(instances, INSTANCE)
+    cells = np.floor(instances["pos"][:, [0, 2]] / chunk_size).astype(np.int32)
+    order = np.lexsort((cells[:, 1], cells[:, 0]))
+    instances = instances[order]
+    cells = cells[order]
+
+    # runs of equal cells are the chunks, an empty world has none
+    starts = np.flatnonzero(np.any(np.diff(cells, axis=0) != 0, axis=1)) + 1
+    if len(instances):
+        starts = np.concatenate(([0], starts))
+    starts = starts.astype(np.int64)
+    counts = np.diff(np.append(starts, len(instances)))
+    chunks = np.zeros(len(starts), CHUNK)
+    for i, (first, count) in enumerate(zip(starts, counts)):
+        part = instances[first : first + count]
+        chunks[i] = (cells[first], part["lo"].min(0), part["hi"].max(0), first, count)
+
+    names = "\n".join(mesh_names).encode()
+    header = np.zeros((), HEADER)
+    header["magic"] = MAGIC
+    header["version"] = VERSION
+    header["chunk_size"] = chunk_size
+    header["mesh_count"] = len(mesh_names)
+    header["chunk_count"] = len(chunks)
+    header["names_offset"] = HEADER.itemsize
+    header["chunks_offset"] = _align(HEADER.itemsize + len(names))
+    header["instances_offset"] = _align(header["chunks_offset"] + chunks.nbytes)
+
+    with open(path, "wb") as f:
+        f.write(header.tobytes())
+        f.write(names)
+        f.seek(int(header["chunks_offset"]))
+        f.write(chunks.tobytes())
+        f.seek(int(header["instances_offset"]))
+        f.write(instances.tobytes())
+
+
+def world_instances(pos, rot, scale, mesh, bounds):
+    # fill an INSTANCE array, bounds is the model space (lo, hi) of each mesh
+    pos = np.asarray(pos, np.float32).reshape(-1, 3)
+    out = np.zeros(len(pos), INSTANCE)
+    out["pos"] = pos
+    out["rot"] = rot
+    out["scale"] = scale
+    out["mesh"] = mesh
+    # world bounds like Instance.world_bounds: the box is rotated about y,
+    # then scaled and moved, see model_matrix
+    lo = np.asarray(bounds[0], np.float32)
+    hi = np.asarray(bounds[1], np.float32)
+    center = (lo + hi) / 2
+    half = (hi - lo) / 2
+    c = np.cos(out["rot"])
+    s = np.sin(out["rot"])
+    center = np.stack(
+        (
+            center[0] * c + center[2] * s,
+            np.full_like(c, center[1]),
+            -center[0] * s + center[2] * c,
+        ),
+        axis=1,
+    )
+    extent = np.stack(
+        (
+            half[0] * np.abs(c) + half[2] * np.abs(s),
+            np.full_like(c, half[1]),
+            half[0] * np.abs(s) + half[2] * np.abs(c),
+        ),
+        axis=1,
+    )
+    out["lo"] = pos + (center - extent) * out["scale"]
+    out["hi"] = pos + (center + extent) * out["scale"]
+    return out
+
+
+class World:
+    """A chunked world file, memory mapped.
+
+    Only the chunk table is read up front. Instance records are views into the
+    mapping, the os pages them in when a chunk is read and can drop them again
+    under memory pressure.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        header = np.frombuffer(self.mm, HEADER, 1).copy()[0]
+        if header["magic"] != MAGIC or header["version"] != VERSION:
+            self.mm.close()
+            raise ValueError(f"{path!r} is not a version {VERSION} world file")
+        self.chunk_size = float(header["chunk_size"])
+        names_offset = int(header["names_offset"])
+        names = self.mm[names_offset : int(header["chunks_offset"])].rstrip(b"\0")
+        self.mesh_names = names.decode().split("\n")[: int(header["mesh_count"])]
+        self.chunks = np.frombuffer(
+            self.mm, CHUNK, int(header["chunk_count"]), int(header["chunks_offset"])
+        ).copy()
+        self.instances_offset = int(header["instances_offset"])
+
+    def __len__(self):
+        return len(self.chunks)
+
+    def read_chunk(self, index):
+        chunk = self.chunks[index]
+        offset = self.instances_offset + int(chunk["first"]) * INSTANCE.itemsize
+        return np.frombuffer(self.mm, INSTANCE, int(chunk["count"]), offset)
+
+    def chunks_near(self, pos, radius):
+        # chunk indices whose bounds come within radius of pos, nearest first
+        p = np.asarray(pos, np.float32)
+        gap = np.maximum(np.maximum(self.chunks["lo"] - p, p - self.chunks["hi"]), 0)
+        dist = np.linalg.norm(gap, axis=1)
+        near = np.flatnonzero(dist <= radius)
+        return near[np.argsort(dist[near], kind="stable")]
+
+    def close(self):
+        self.mm.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def make_instances(records, meshes):
+    # Instance objects for a chunk's records, meshes is indexed like mesh_names
+    # the bounds stored with each record save the corner transforms
+    return [
+        Instance(meshes[mesh], pos, rot, scale, bounds=(glm.vec3(lo), glm.vec3(hi)))
+        for pos, rot, scale, mesh, lo, hi in records.tolist()
+    ]
+
+
+class ChunkStreamer:
+    """Keeps the chunks of a World around the camera loaded into a Scene.
+
+    update(pos) asks a background thread for chunks within radius that are
+    not resident yet, and adds chunks it finished loading to the scene. The
+    scene is only touched from the caller's thread and only inside update(),
+    with a pipelined RenderContext call wait_prepared() before it. Resident
+    chunks are kept in least recently needed order and evicted from the front
+    once more than budget instances are resident, so memory stays bounded
+    however large the world is.
+    """
+
+    def __init__(self, world, scene, meshes, radius=120.0, budget=4096):
+        self.world = world
+        self.scene = scene
+        # resolve the file's mesh names once, the loader only indexes
+        self.meshes = [meshes[name] for name in world.mesh_names]
+        self.radius = radius
+        self.budget = budget
+
+        self.resident = OrderedDict()  # chunk index -> instances
+        self.resident_count = 0
+        self.requested = set()
+        self.requests = queue.Queue()
+        self.loaded = queue.Queue()
+        self.thread = threading.Thread(
+            target=self._load_loop, name="chunk-loader", daemon=True
+        )
+        self.thread.start()
+
+        self.loads = 0
+        self.evictions = 0
+
+    def _load_loop(self):
+        while True:
+            index = self.requests.get()
+            if index is None:
+                return
+            records = self.world.read_chunk(index)
+            self.loaded.put((index, make_instances(records, self.meshes)))
+
+    def update(self, pos):
+        wanted = self.world.chunks_near(pos, self.radius).tolist()
+        # farthest first, so the nearest chunks end up most recently used
+        for index in reversed(wanted):
+            if index in self.resident:
+                self.resident.move_to_end(index)
+            elif index not in self.requested:
+                self.requested.add(index)
+                self.requests.put(index)
+
+        while True:
+            try:
+                index, instances = self.loaded.get_nowait()
+            except queue.Empty:
+                break
+            self.requested.discard(index)
+            self.resident[index] = instances
+            if index not in wanted:
+                # the camera moved on while it loaded, evict it first
+                self.resident.move_to_end(index, last=False)
+            self.resident_count += len(instances)
+            self.scene.add_many(instances)
+            self.loads += 1
+
+        while self.resident_count > self.budget and len(self.resident) > 1:
+            _, instances = self.resident.popitem(last=False)
+            self.resident_count -= len(instances)
+            self.scene.remove_many(instances)
+            self.evictions += 1
+
+    def close(self):
+        self.requests.put(None)
+        self.thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def default_meshes():
+    return {"cube": cube_mesh()}
+
+
+def write_cube_grid_world(path, count=100, spacing=15.0, chunk_size=64.0):
+    # the cube grid of gen_cube_grid_scene, at any size
+    x, z = np.meshgrid(np.arange(count), np.arange(count), indexing="xy")
+    pos = np.stack((x.ravel() * spacing, np.zeros(x.size), z.ravel() * spacing), axis=1)
+    cube = cube_mesh()
+    bounds = (cube.bounds[0].to_tuple(), cube.bounds[1].to_tuple())
+    instances = world_instances(pos, 0.0, 5.0, 0, bounds)
+    write_world(path, instances, ["cube"], chunk_size)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="write a chunked world file")
+    parser.add_argument("path")
+    parser.add_argument("--count", type=int, default=100, help="cubes per side")
+    parser.add_argument("--spacing", type=float, default=15.0)
+    parser.add_argument("--chunk-size", type=float, default=64.0)
+    args = parser.parse_args()
+    write_cube_grid_world(args.path, args.count, args.spacing, args.chunk_size)
+
+
+if __name__ == "__main__":
+    main()